@@ -1,15 +1,34 @@
+import functools
 import logging
 import os
+import re
 import shlex
 import shutil
 from dataclasses import dataclass, field
-from typing import List, Optional, Union
+from typing import Callable, List, Mapping, Optional, TypeVar, Union
 from modules.im.base import BaseIMConfig
 
 logger = logging.getLogger(__name__)
 
+_TRUTHY = frozenset({"1", "true", "yes", "on"})
+_NULLISH = frozenset({"null", "none"})
+_LIST_SPLIT = re.compile(r"[,\s\[\]]+")
 
-@dataclass
+T = TypeVar("T")
+
+
+@functools.lru_cache(maxsize=8)
+def _which_cached(binary: str) -> Optional[str]:
+    """Cached shutil.which; negative results are cached too."""
+    return shutil.which(binary)
+
+
+def _parse_id_list(value: str, cast: Callable[[str], T] = str) -> List[T]:
+    """Split a "[a, b]" / "a,b" style ID list; brackets and blanks are dropped."""
+    return [cast(token) for token in _LIST_SPLIT.split(value) if token]
+
+
+@dataclass(slots=True)
 class TelegramConfig(BaseIMConfig):
     bot_token: str
     target_chat_id: Optional[Union[List[int], str]] = (
@@ -17,29 +36,23 @@ class TelegramConfig(BaseIMConfig):
     )
 
     @classmethod
-    def from_env(cls) -> "TelegramConfig":
-        bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
+    def from_env(cls, env: Optional[Mapping[str, str]] = None) -> "TelegramConfig":
+        if env is None:
+            env = os.environ
+        bot_token = env.get("TELEGRAM_BOT_TOKEN")
         if not bot_token:
             raise ValueError("TELEGRAM_BOT_TOKEN environment variable is required")
 
         target_chat_id = None
-        target_chat_id_str = os.getenv("TELEGRAM_TARGET_CHAT_ID")
+        target_chat_id_str = env.get("TELEGRAM_TARGET_CHAT_ID")
         if target_chat_id_str:
             # Handle null string
-            if target_chat_id_str.lower() in ["null", "none"]:
+            if target_chat_id_str.lower() in _NULLISH:
                 target_chat_id = None
-            # Handle empty list
-            elif target_chat_id_str.strip() in ["[]", ""]:
-                target_chat_id = []
-            # Handle comma-separated list
+            # Handle comma-separated list ("[]" yields an empty list = DM only)
             else:
                 try:
-                    # Remove brackets if present and split by comma
-                    ids_str = target_chat_id_str.strip("[]")
-                    if ids_str:
-                        target_chat_id = [int(id.strip()) for id in ids_str.split(",")]
-                    else:
-                        target_chat_id = []
+                    target_chat_id = _parse_id_list(target_chat_id_str, cast=int)
                 except ValueError:
                     raise ValueError(
                         f"Invalid TELEGRAM_TARGET_CHAT_ID format: {target_chat_id_str}"
@@ -63,47 +76,51 @@ class TelegramConfig(BaseIMConfig):
         return True
 
 
-@dataclass
+@dataclass(slots=True)
 class ClaudeConfig:
     permission_mode: str
     cwd: str
     system_prompt: Optional[str] = None
 
     @classmethod
-    def from_env(cls) -> "ClaudeConfig":
-        permission_mode = os.getenv("CLAUDE_PERMISSION_MODE")
+    def from_env(cls, env: Optional[Mapping[str, str]] = None) -> "ClaudeConfig":
+        if env is None:
+            env = os.environ
+        permission_mode = env.get("CLAUDE_PERMISSION_MODE")
         if not permission_mode:
             raise ValueError("CLAUDE_PERMISSION_MODE environment variable is required")
 
-        cwd = os.getenv("CLAUDE_DEFAULT_CWD")
+        cwd = env.get("CLAUDE_DEFAULT_CWD")
         if not cwd:
             raise ValueError("CLAUDE_DEFAULT_CWD environment variable is required")
 
         return cls(
             permission_mode=permission_mode,
             cwd=cwd,
-            system_prompt=os.getenv("CLAUDE_SYSTEM_PROMPT"),
+            system_prompt=env.get("CLAUDE_SYSTEM_PROMPT"),
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class CodexConfig:
     binary: str = "codex"
     extra_args: List[str] = field(default_factory=list)
     default_model: Optional[str] = None
 
     @classmethod
-    def from_env(cls) -> "CodexConfig":
-        binary = os.getenv("CODEX_CLI_PATH", "codex")
-        if not shutil.which(binary):
+    def from_env(cls, env: Optional[Mapping[str, str]] = None) -> "CodexConfig":
+        if env is None:
+            env = os.environ
+        binary = env.get("CODEX_CLI_PATH", "codex")
+        if not _which_cached(binary):
             raise ValueError(
                 f"Codex CLI binary '{binary}' not found in PATH. "
                 "Set CODEX_CLI_PATH or install Codex CLI."
             )
 
-        extra_args_env = os.getenv("CODEX_EXTRA_ARGS", "").strip()
+        extra_args_env = env.get("CODEX_EXTRA_ARGS", "").strip()
         extra_args = shlex.split(extra_args_env) if extra_args_env else []
-        default_model = os.getenv("CODEX_DEFAULT_MODEL")
+        default_model = env.get("CODEX_DEFAULT_MODEL")
 
         return cls(
             binary=binary,
@@ -112,21 +129,23 @@ class CodexConfig:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class OpenCodeConfig:
     binary: str = "opencode"
     port: int = 4096
 
     @classmethod
-    def from_env(cls) -> "OpenCodeConfig":
-        binary = os.getenv("OPENCODE_CLI_PATH", "opencode")
-        if not shutil.which(binary):
+    def from_env(cls, env: Optional[Mapping[str, str]] = None) -> "OpenCodeConfig":
+        if env is None:
+            env = os.environ
+        binary = env.get("OPENCODE_CLI_PATH", "opencode")
+        if not _which_cached(binary):
             raise ValueError(
                 f"OpenCode CLI binary '{binary}' not found in PATH. "
                 "Install OpenCode or set OPENCODE_CLI_PATH."
             )
 
-        port_str = os.getenv("OPENCODE_PORT", "4096")
+        port_str = env.get("OPENCODE_PORT", "4096")
         try:
             port = int(port_str)
         except ValueError:
@@ -141,7 +160,7 @@ class OpenCodeConfig:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class SlackConfig(BaseIMConfig):
     bot_token: str
     app_token: Optional[str] = None  # For Socket Mode
@@ -152,18 +171,20 @@ class SlackConfig(BaseIMConfig):
     require_mention: bool = False  # Require @mention in channels (ignored in DMs)
 
     @classmethod
-    def from_env(cls) -> "SlackConfig":
-        bot_token = os.getenv("SLACK_BOT_TOKEN")
+    def from_env(cls, env: Optional[Mapping[str, str]] = None) -> "SlackConfig":
+        if env is None:
+            env = os.environ
+        bot_token = env.get("SLACK_BOT_TOKEN")
         if not bot_token:
             raise ValueError("SLACK_BOT_TOKEN environment variable is required")
 
         return cls(
             bot_token=bot_token,
-            app_token=os.getenv("SLACK_APP_TOKEN"),
-            signing_secret=os.getenv("SLACK_SIGNING_SECRET"),
-            target_channel=cls._parse_channel_list(os.getenv("SLACK_TARGET_CHANNEL")),
-            require_mention=os.getenv("SLACK_REQUIRE_MENTION", "false").lower()
-            == "true",
+            app_token=env.get("SLACK_APP_TOKEN"),
+            signing_secret=env.get("SLACK_SIGNING_SECRET"),
+            target_channel=cls._parse_channel_list(env.get("SLACK_TARGET_CHANNEL")),
+            require_mention=env.get("SLACK_REQUIRE_MENTION", "false").lower()
+            in _TRUTHY,
         )
 
     def validate(self) -> bool:
@@ -185,20 +206,11 @@ class SlackConfig(BaseIMConfig):
             return None
 
         # Handle null string
-        if value.lower() in ["null", "none"]:
+        if value.lower() in _NULLISH:
             return None
 
-        # Handle empty list
-        if value.strip() in ["[]", ""]:
-            return []
-
-        # Handle comma-separated list
-        # Remove brackets if present and split by comma
-        ids_str = value.strip("[]")
-        if ids_str:
-            return [id.strip() for id in ids_str.split(",")]
-        else:
-            return []
+        # Handle comma-separated list ("[]" yields an empty list = DM only)
+        return _parse_id_list(value)
 
 
 @dataclass
@@ -207,15 +219,32 @@ class AppConfig:
     telegram: Optional[TelegramConfig] = None
     slack: Optional[SlackConfig] = None
     claude: ClaudeConfig = None
-    codex: Optional[CodexConfig] = None
+    codex_enabled: bool = False
     opencode: Optional[OpenCodeConfig] = None
     log_level: str = "INFO"
     cleanup_enabled: bool = False
     agent_route_file: Optional[str] = None
+    # Environment snapshot taken by from_env, reused for lazily loaded configs
+    _env: Optional[Mapping[str, str]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    @functools.cached_property
+    def codex(self) -> Optional[CodexConfig]:
+        """Codex config, resolved (PATH lookup included) on first access"""
+        if not self.codex_enabled:
+            return None
+        try:
+            return CodexConfig.from_env(self._env)
+        except ValueError as exc:
+            logger.warning(f"Codex support disabled: {exc}")
+            return None
 
     @classmethod
     def from_env(cls) -> "AppConfig":
-        platform = os.getenv("IM_PLATFORM")
+        # One snapshot per load; every sub-config reads from it
+        env = dict(os.environ)
+        platform = env.get("IM_PLATFORM")
         if not platform:
             raise ValueError("IM_PLATFORM environment variable is required")
 
@@ -225,65 +254,48 @@ class AppConfig:
                 f"Invalid IM_PLATFORM: {platform}. Must be 'telegram' or 'slack'"
             )
 
-        log_level = os.getenv(
+        log_level = env.get(
             "LOG_LEVEL", "INFO"
         )  # Keep default for log level as it's optional
 
         # Cleanup toggle (safe cleanup of completed tasks only)
-        cleanup_enabled_env = os.getenv("CLEANUP_ENABLED", "false").lower()
-        cleanup_enabled = cleanup_enabled_env in ["1", "true", "yes", "on"]
+        cleanup_enabled_env = env.get("CLEANUP_ENABLED", "false").lower()
+        cleanup_enabled = cleanup_enabled_env in _TRUTHY
 
-        agent_route_env = os.getenv("AGENT_ROUTE_FILE")
+        agent_route_env = env.get("AGENT_ROUTE_FILE")
         agent_route_file = agent_route_env
         if not agent_route_file:
             candidate = os.path.join(os.getcwd(), "agent_routes.yaml")
             if os.path.exists(candidate):
                 agent_route_file = candidate
 
-        codex_config = None
-        codex_enabled = os.getenv("CODEX_ENABLED", "true").lower() in [
-            "1",
-            "true",
-            "yes",
-            "on",
-        ]
-        if codex_enabled:
-            try:
-                codex_config = CodexConfig.from_env()
-            except ValueError as exc:
-                logger.warning(f"Codex support disabled: {exc}")
-                codex_config = None
+        codex_enabled = env.get("CODEX_ENABLED", "true").lower() in _TRUTHY
 
         opencode_config = None
-        opencode_enabled = os.getenv("OPENCODE_ENABLED", "false").lower() in [
-            "1",
-            "true",
-            "yes",
-            "on",
-        ]
+        opencode_enabled = env.get("OPENCODE_ENABLED", "false").lower() in _TRUTHY
         if opencode_enabled:
             try:
-                opencode_config = OpenCodeConfig.from_env()
+                opencode_config = OpenCodeConfig.from_env(env)
             except ValueError as exc:
                 logger.warning(f"OpenCode support disabled: {exc}")
                 opencode_config = None
 
         config = cls(
             platform=platform,
-            claude=ClaudeConfig.from_env(),
+            claude=ClaudeConfig.from_env(env),
             log_level=log_level,
             cleanup_enabled=cleanup_enabled,
-            codex=codex_config,
+            codex_enabled=codex_enabled,
             opencode=opencode_config,
             agent_route_file=agent_route_file,
         )
+        config._env = env
 
-        # Load platform-specific config
+        # Load platform-specific config (validated on first use, see
+        # BaseIMConfig.ensure_validated)
         if platform == "telegram":
-            config.telegram = TelegramConfig.from_env()
-            config.telegram.validate()
+            config.telegram = TelegramConfig.from_env(env)
         elif platform == "slack":
-            config.slack = SlackConfig.from_env()
-            config.slack.validate()
+            config.slack = SlackConfig.from_env(env)
 
         return config
@@ -1,9 +1,13 @@
 """Core controller that coordinates between modules and handlers"""
 
 import asyncio
+import contextlib
+import functools
+import inspect
 import os
 import logging
-from typing import Optional, Dict, Any
+from dataclasses import dataclass, field
+from typing import Optional, Dict, FrozenSet, List, Set, Tuple
 from config.settings import AppConfig
 from modules.im import BaseIMClient, MessageContext, IMFactory
 from modules.im.formatters import TelegramFormatter, SlackFormatter
@@ -13,6 +17,7 @@ from modules.claude_client import ClaudeClient
 from modules.session_manager import SessionManager
 from modules.settings_manager import SettingsManager
 from core.handlers import (
+    ClaudeSession,
     CommandHandlers,
     SessionHandler,
     SettingsHandler,
@@ -21,6 +26,55 @@ from core.handlers import (
 
 logger = logging.getLogger(__name__)
 
+# Platform name -> markdown formatter class
+_FORMATTERS = {
+    "telegram": TelegramFormatter,
+    "slack": SlackFormatter,
+}
+
+# Agent message batching: consecutive chunks of the same type for one
+# conversation are merged into a single send after a short debounce.
+EMIT_BATCH_DELAY = 0.1  # seconds
+EMIT_BATCH_MAX_CHUNKS = 16
+EMIT_BATCH_MAX_CHARS = 3500
+# Per-platform caps on the raw text of one batch. Telegram's 4096 limit applies
+# after MarkdownV2 conversion, whose escaping can double the text.
+EMIT_BATCH_MAX_CHARS_BY_PLATFORM = {"telegram": 2000}
+# Types that are sent right away (after flushing anything queued before them)
+EMIT_IMMEDIATE_TYPES = frozenset({"notify", "result"})
+# Conversations whose message visibility is cached; the oldest entry is evicted
+EMIT_SETTINGS_CACHE_MAX = 1024
+# Settings keys whose resolved agent is cached; the oldest entry is evicted
+AGENT_CACHE_MAX = 1024
+# Settings keys whose custom cwd is cached; the oldest entry is evicted
+CWD_CACHE_MAX = 1024
+
+
+@dataclass
+class _PendingEmit:
+    """Agent message chunks waiting to be sent as one IM message."""
+
+    context: MessageContext
+    message_type: str
+    parse_mode: Optional[str]
+    chunks: List[str] = field(default_factory=list)
+    size: int = 0
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+@functools.lru_cache(maxsize=4096)
+def _settings_key_impl(platform: str, user_id: str, channel_id: str) -> str:
+    """Settings key for a (platform, user, channel) triple"""
+    if platform == "slack":
+        # For Slack, always use channel_id as the key
+        return channel_id
+    if platform == "telegram":
+        # For Telegram groups, use channel_id; for DMs use user_id
+        if channel_id != user_id:
+            return channel_id
+        return user_id
+    return user_id
+
 
 class Controller:
     """Main controller that coordinates all bot operations"""
@@ -30,9 +84,26 @@ class Controller:
         self.config = config
 
         # Session tracking (must be initialized before handlers)
-        self.claude_sessions: Dict[str, Any] = {}
-        self.receiver_tasks: Dict[str, asyncio.Task] = {}
-        self.stored_session_mappings: Dict[str, str] = {}
+        # composite_key -> ClaudeSession (SDK client + its receiver task)
+        self.claude_sessions: Dict[str, ClaudeSession] = {}
+
+        # (user_id, channel_id) -> (visibility version, settings_key, hidden types)
+        self._emit_settings_cache: Dict[
+            Tuple[str, str], Tuple[int, str, FrozenSet[str]]
+        ] = {}
+        # (channel_id, thread_id) -> batched agent message chunks
+        self._emit_buffers: Dict[Tuple[str, Optional[str]], _PendingEmit] = {}
+        self._emit_batch_max_chars = EMIT_BATCH_MAX_CHARS_BY_PLATFORM.get(
+            config.platform, EMIT_BATCH_MAX_CHARS
+        )
+        # (channel_id, thread_id) -> send lock and the number of sends using it
+        self._emit_locks: Dict[Tuple[str, Optional[str]], asyncio.Lock] = {}
+        self._emit_lock_users: Dict[Tuple[str, Optional[str]], int] = {}
+        self._emit_flush_tasks: Set[asyncio.Task] = set()
+        # settings_key -> (cwd version, absolute custom cwd or None)
+        self._cwd_cache: Dict[str, Tuple[int, Optional[str]]] = {}
+        # settings_key -> (routing version, resolved agent name)
+        self._agent_cache: Dict[str, Tuple[int, str]] = {}
 
         # Initialize core modules
         self._init_modules()
@@ -54,19 +125,27 @@ class Controller:
 
     def _init_modules(self):
         """Initialize core modules"""
+        # Bind the platform into the cached settings key resolver once
+        self._settings_key_fn = functools.partial(
+            _settings_key_impl, self.config.platform
+        )
+
+        # Validate platform config once, right before the client needs it
+        platform_config = getattr(self.config, self.config.platform, None)
+        if platform_config is not None:
+            platform_config.ensure_validated()
+
         # Create IM client with platform-specific formatter
         self.im_client: BaseIMClient = IMFactory.create_client(self.config)
 
-        # Create platform-specific formatter
-        if self.config.platform == "telegram":
-            formatter = TelegramFormatter()
-        elif self.config.platform == "slack":
-            formatter = SlackFormatter()
-        else:
-            logger.warning(
-                f"Unknown platform: {self.config.platform}, using Telegram formatter"
-            )
-            formatter = TelegramFormatter()
+        # Create platform-specific formatter (AppConfig rejects unknown platforms)
+        formatter = _FORMATTERS.get(self.config.platform, TelegramFormatter)()
+
+        # Classify im_client.stop once; cleanup_sync only calls sync stops
+        stop_attr = getattr(self.im_client, "stop", None)
+        self._im_client_stop_is_coro: Optional[bool] = (
+            inspect.iscoroutinefunction(stop_attr) if callable(stop_attr) else None
+        )
 
         # Inject formatter into clients
         self.im_client.formatter = formatter
@@ -76,19 +155,18 @@ class Controller:
         self.session_manager = SessionManager()
         self.settings_manager = SettingsManager()
 
-        # Agent routing (service initialized later after handlers)
-        self.agent_router = AgentRouter.from_file(
+        # Inject settings_manager into clients that track threads (Slack)
+        if self.im_client.supports_settings_manager_injection:
+            self.im_client.set_settings_manager(self.settings_manager)
+            logger.info("Injected settings_manager into IM client for thread tracking")
+
+    @functools.cached_property
+    def agent_router(self) -> AgentRouter:
+        """Agent routing table, loaded from the route file on first use"""
+        return AgentRouter.from_file(
             self.config.agent_route_file, platform=self.config.platform
         )
 
-        # Inject settings_manager into SlackBot if it's Slack platform
-        if self.config.platform == "slack":
-            # Import here to avoid circular dependency
-            from modules.im.slack import SlackBot
-            if isinstance(self.im_client, SlackBot):
-                self.im_client.set_settings_manager(self.settings_manager)
-                logger.info("Injected settings_manager into SlackBot for thread tracking")
-
     def _init_handlers(self):
         """Initialize all handlers with controller reference"""
         # Initialize session_handler first as other handlers depend on it
@@ -138,23 +216,43 @@ class Controller:
 
     # Utility methods used by handlers
 
-    def get_cwd(self, context: MessageContext) -> str:
+    def get_cwd(
+        self, context: MessageContext, settings_key: Optional[str] = None
+    ) -> str:
         """Get working directory based on context (channel/chat)
         This is the SINGLE source of truth for CWD
         """
-        # Get the settings key based on context
-        settings_key = self._get_settings_key(context)
-
-        # Get custom CWD from settings
-        custom_cwd = self.settings_manager.get_custom_cwd(settings_key)
-
-        # Use custom CWD if available, otherwise use default from .env
+        # Get the settings key based on context (callers may pass it in)
+        if settings_key is None:
+            settings_key = self._get_settings_key(context)
+
+        # Reuse the settings lookup until a custom cwd is set (e.g. /set_cwd)
+        version = self.settings_manager.cwd_version
+        cached = self._cwd_cache.get(settings_key)
+        if cached and cached[0] == version:
+            custom_cwd = cached[1]
+        else:
+            # Get custom CWD from settings
+            custom_cwd = self.settings_manager.get_custom_cwd(settings_key)
+            if custom_cwd:
+                custom_cwd = os.path.abspath(custom_cwd)
+            cache = self._cwd_cache
+            if cached is None and len(cache) >= CWD_CACHE_MAX:
+                cache.pop(next(iter(cache)))
+            cache[settings_key] = (version, custom_cwd)
+
+        # Use custom CWD if it still exists, otherwise use default from .env
         if custom_cwd and os.path.exists(custom_cwd):
-            return os.path.abspath(custom_cwd)
+            return custom_cwd
         elif custom_cwd:
             logger.warning(f"Custom CWD does not exist: {custom_cwd}, using default")
 
         # Fall back to default from .env
+        return self._default_cwd
+
+    @functools.cached_property
+    def _default_cwd(self) -> str:
+        """Default working directory from .env, resolved once"""
         default_cwd = self.config.claude.cwd
         if default_cwd:
             return os.path.abspath(os.path.expanduser(default_cwd))
@@ -164,29 +262,19 @@ class Controller:
 
     def _get_settings_key(self, context: MessageContext) -> str:
         """Get settings key based on context"""
-        if self.config.platform == "slack":
-            # For Slack, always use channel_id as the key
-            return context.channel_id
-        elif self.config.platform == "telegram":
-            # For Telegram groups, use channel_id; for DMs use user_id
-            if context.channel_id != context.user_id:
-                return context.channel_id
-            return context.user_id
-        return context.user_id
+        return self._settings_key_fn(context.user_id, context.channel_id)
 
     def _get_target_context(self, context: MessageContext) -> MessageContext:
-        """Get target context for sending messages"""
-        if self.im_client.should_use_thread_for_reply() and context.thread_id:
-            return MessageContext(
-                user_id=context.user_id,
-                channel_id=context.channel_id,
-                thread_id=context.thread_id,
-                message_id=context.message_id,
-                platform_specific=context.platform_specific,
-            )
+        """Get target context for sending messages
+
+        Thread replies are routed by context.thread_id, so the incoming context
+        is already the target; no per-message copy is needed.
+        """
         return context
 
-    def resolve_agent_for_context(self, context: MessageContext) -> str:
+    def resolve_agent_for_context(
+        self, context: MessageContext, settings_key: Optional[str] = None
+    ) -> str:
         """Unified agent resolution with dynamic override support.
 
         Priority:
@@ -196,8 +284,24 @@ class Controller:
         4. agent_routes.yaml global default
         5. AgentService.default_agent ("claude")
         """
-        settings_key = self._get_settings_key(context)
-
+        if settings_key is None:
+            settings_key = self._get_settings_key(context)
+
+        # Reuse the resolved agent until routing changes (e.g. routing modal)
+        version = self.settings_manager.routing_version
+        cached = self._agent_cache.get(settings_key)
+        if cached and cached[0] == version:
+            return cached[1]
+
+        agent_name = self._resolve_agent(settings_key)
+        cache = self._agent_cache
+        if cached is None and len(cache) >= AGENT_CACHE_MAX:
+            cache.pop(next(iter(cache)))
+        cache[settings_key] = (version, agent_name)
+        return agent_name
+
+    def _resolve_agent(self, settings_key: str) -> str:
+        """Resolve agent for a settings key without caching"""
         # Check dynamic override first
         routing = self.settings_manager.get_channel_routing(settings_key)
         if routing and routing.agent_backend:
@@ -232,6 +336,25 @@ class Controller:
             )
         return None, None, None
 
+    def _get_emit_settings(
+        self, context: MessageContext
+    ) -> Tuple[str, FrozenSet[str]]:
+        """Get (settings_key, hidden message types) for a context, cached"""
+        cache = self._emit_settings_cache
+        cache_key = (context.user_id, context.channel_id)
+        version = self.settings_manager.visibility_version
+        cached = cache.get(cache_key)
+        if cached is not None and cached[0] == version:
+            return cached[1], cached[2]
+
+        settings_key = self._get_settings_key(context)
+        user_settings = self.settings_manager.get_user_settings(settings_key)
+        hidden_types = frozenset(user_settings.hidden_message_types)
+        if cached is None and len(cache) >= EMIT_SETTINGS_CACHE_MAX:
+            cache.pop(next(iter(cache)))
+        cache[cache_key] = (version, settings_key, hidden_types)
+        return settings_key, hidden_types
+
     async def emit_agent_message(
         self,
         context: MessageContext,
@@ -240,25 +363,127 @@ class Controller:
         parse_mode: str = "markdown",
     ):
         """Centralized dispatch for agent messages with filtering."""
-        if not text or not text.strip():
+        # isspace() checks in place; strip() would copy the whole payload
+        if not text or text.isspace():
             return
-        settings_key = self._get_settings_key(context)
-        if (
-            message_type != "notify"
-            and self.settings_manager.is_message_type_hidden(settings_key, message_type)
+        settings_key, hidden_types = self._get_emit_settings(context)
+        canonical_type = self.settings_manager.MESSAGE_TYPE_ALIASES.get(
+            message_type, message_type
+        )
+        if message_type != "notify" and canonical_type in hidden_types:
+            if logger.isEnabledFor(logging.INFO):
+                preview = text[:500] + "…" if len(text) > 500 else text
+                logger.info(
+                    "Skipping %s message for settings %s (hidden). Preview: %s",
+                    message_type,
+                    settings_key,
+                    preview,
+                )
+            return
+
+        key = (context.channel_id, context.thread_id)
+        if message_type in EMIT_IMMEDIATE_TYPES:
+            await self._flush_emit_buffer(key)
+            await self._send_agent_message(key, context, text, parse_mode)
+            return
+
+        pending = self._emit_buffers.get(key)
+        if pending and (
+            pending.message_type != message_type
+            or pending.parse_mode != parse_mode
+            or pending.size + len(text) > self._emit_batch_max_chars
         ):
-            preview = text if len(text) <= 500 else f"{text[:500]}…"
-            logger.info(
-                "Skipping %s message for settings %s (hidden). Preview: %s",
-                message_type,
-                settings_key,
-                preview,
+            await self._flush_emit_buffer(key)
+            pending = None
+        if pending is None:
+            pending = _PendingEmit(
+                context=context, message_type=message_type, parse_mode=parse_mode
             )
+            pending.timer = asyncio.get_running_loop().call_later(
+                EMIT_BATCH_DELAY, self._schedule_emit_flush, key
+            )
+            self._emit_buffers[key] = pending
+        pending.chunks.append(text)
+        pending.size += len(text)
+        if len(pending.chunks) >= EMIT_BATCH_MAX_CHUNKS:
+            await self._flush_emit_buffer(key)
+
+    def _schedule_emit_flush(self, key: Tuple[str, Optional[str]]):
+        """Debounce timer callback: flush the batch in a background task."""
+        task = asyncio.create_task(self._flush_emit_buffer(key))
+        self._emit_flush_tasks.add(task)
+        task.add_done_callback(self._emit_flush_tasks.discard)
+
+    async def _flush_emit_buffer(self, key: Tuple[str, Optional[str]]):
+        pending = self._emit_buffers.pop(key, None)
+        if not pending:
             return
+        if pending.timer:
+            pending.timer.cancel()
+        async with self._emit_lock(key):
+            try:
+                await self._send_im_message(
+                    pending.context, "\n\n".join(pending.chunks), pending.parse_mode
+                )
+                return
+            except Exception as e:
+                if len(pending.chunks) == 1:
+                    logger.error(
+                        f"Failed to send {pending.message_type} message: {e}"
+                    )
+                    return
+                logger.warning(
+                    f"Failed to send batched {pending.message_type} message, "
+                    f"sending {len(pending.chunks)} chunks separately: {e}"
+                )
+            for chunk in pending.chunks:
+                try:
+                    await self._send_im_message(
+                        pending.context, chunk, pending.parse_mode
+                    )
+                except Exception as e:
+                    logger.error(
+                        f"Failed to send {pending.message_type} message: {e}"
+                    )
+
+    async def _send_agent_message(
+        self,
+        key: Tuple[str, Optional[str]],
+        context: MessageContext,
+        text: str,
+        parse_mode: Optional[str],
+    ):
+        async with self._emit_lock(key):
+            await self._send_im_message(context, text, parse_mode)
+
+    async def _send_im_message(
+        self, context: MessageContext, text: str, parse_mode: Optional[str]
+    ):
         target_context = self._get_target_context(context)
-        await self.im_client.send_message(
-            target_context, text, parse_mode=parse_mode
-        )
+        await self.im_client.send_message(target_context, text, parse_mode=parse_mode)
+
+    @contextlib.asynccontextmanager
+    async def _emit_lock(self, key: Tuple[str, Optional[str]]):
+        """Serialize sends per conversation so batches never overtake each other.
+
+        The lock is dropped once nothing holds or awaits it and no batch is
+        pending, so idle conversations don't keep one around.
+        """
+        lock = self._emit_locks.get(key)
+        if lock is None:
+            lock = self._emit_locks[key] = asyncio.Lock()
+        self._emit_lock_users[key] = self._emit_lock_users.get(key, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            users = self._emit_lock_users[key] - 1
+            if users:
+                self._emit_lock_users[key] = users
+            else:
+                del self._emit_lock_users[key]
+                if key not in self._emit_buffers:
+                    del self._emit_locks[key]
 
     # Settings update handler (for Slack modal)
     async def handle_settings_update(
@@ -266,20 +491,13 @@ class Controller:
     ):
         """Handle settings update (typically from Slack modal)"""
         try:
-            # Determine settings key - for Slack, always use channel_id
-            if self.config.platform == "slack":
-                settings_key = (
-                    channel_id if channel_id else user_id
-                )  # fallback to user_id if no channel
-            else:
-                settings_key = channel_id if channel_id else user_id
-
-            # Update settings
-            user_settings = self.settings_manager.get_user_settings(settings_key)
-            user_settings.hidden_message_types = hidden_message_types
+            # Determine settings key - channel_id, falling back to user_id
+            settings_key = channel_id if channel_id else user_id
 
-            # Save settings - using the correct method name
-            self.settings_manager.update_user_settings(settings_key, user_settings)
+            # Update and save settings
+            self.settings_manager.set_hidden_message_types(
+                settings_key, hidden_message_types
+            )
 
             logger.info(
                 f"Updated settings for {settings_key}: hidden types = {hidden_message_types}"
@@ -413,7 +631,7 @@ class Controller:
 
         # 不再创建额外事件循环，避免与 IM 客户端的内部事件循环冲突
         # 清理职责改为：
-        # - 仅当收到消息且开启 cleanup_enabled 时，在消息入口清理已完成任务（见 MessageHandler）
+        # - 已完成的接收任务通过 done-callback 自动移除（见 ClaudeAgent._evict_receiver_task）
         # - 进程退出时做一次同步的 best-effort 取消（不跨循环 await）
 
         try:
@@ -438,11 +656,12 @@ class Controller:
 
         # Cancel receiver tasks without awaiting (they may belong to other loops)
         try:
-            for session_id, task in list(self.receiver_tasks.items()):
-                if not task.done():
+            for session in self.claude_sessions.values():
+                task = session.receiver_task
+                if task and not task.done():
                     task.cancel()
                 # Remove from registry regardless
-                del self.receiver_tasks[session_id]
+                session.receiver_task = None
         except Exception as e:
             logger.debug(f"Receiver tasks cleanup skipped due to: {e}")
 
@@ -451,12 +670,8 @@ class Controller:
 
         # Attempt to call stop if it's a plain function; skip if coroutine to avoid cross-loop awaits
         try:
-            stop_attr = getattr(self.im_client, "stop", None)
-            if callable(stop_attr):
-                import inspect
-
-                if not inspect.iscoroutinefunction(stop_attr):
-                    stop_attr()
+            if self._im_client_stop_is_coro is False:
+                self.im_client.stop()
         except Exception:
             pass
 
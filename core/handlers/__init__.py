@@ -1,11 +1,12 @@
 """Handler modules for organizing controller functionality"""
 
 from .command_handlers import CommandHandlers
-from .session_handler import SessionHandler
+from .session_handler import ClaudeSession, SessionHandler
 from .settings_handler import SettingsHandler
 from .message_handler import MessageHandler
 
 __all__ = [
+    'ClaudeSession',
     'CommandHandlers',
     'SessionHandler', 
     'SettingsHandler',
@@ -1,13 +1,49 @@
 """Command handlers for bot commands like /start, /clear, /cwd, etc."""
 
+import asyncio
+import dataclasses
 import os
 import logging
-from typing import Optional
-from modules.agents import AgentRequest, get_agent_display_name
+import stat
+import time
+from typing import Any, Dict, Optional, Tuple
+from modules.agents import get_agent_display_name
 from modules.im import MessageContext, InlineKeyboard, InlineButton
 
 logger = logging.getLogger(__name__)
 
+# How long /start reuses user/channel info fetched from the IM platform
+INFO_CACHE_TTL = 300  # seconds
+
+# /start command buttons (Slack); static, so built once and shared
+_START_KEYBOARD = InlineKeyboard(
+    buttons=[
+        # Row 1: Directory management
+        [
+            InlineButton(text="📁 Current Dir", callback_data="cmd_cwd"),
+            InlineButton(text="📂 Change Work Dir", callback_data="cmd_change_cwd"),
+        ],
+        # Row 2: Session and Settings
+        [
+            InlineButton(text="🔄 Clear All Session", callback_data="cmd_clear"),
+            InlineButton(text="⚙️ Settings", callback_data="cmd_settings"),
+        ],
+        # Row 3: Agent/Model switching
+        [InlineButton(text="🤖 Agent Settings", callback_data="cmd_routing")],
+        # Row 4: Help
+        [InlineButton(text="ℹ️ How it Works", callback_data="info_how_it_works")],
+    ]
+)
+
+
+def _probe_dir(path: str) -> Tuple[bool, bool]:
+    """Return (exists, is_dir) for path using a single stat call"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False, False
+    return True, stat.S_ISDIR(st.st_mode)
+
 
 class CommandHandlers:
     """Handles all bot command operations"""
@@ -19,44 +55,78 @@ class CommandHandlers:
         self.im_client = controller.im_client
         self.session_manager = controller.session_manager
         self.settings_manager = controller.settings_manager
+        self._formatter = controller.im_client.formatter
+        self._is_slack = controller.config.platform == "slack"
+        # Optional IM capability, resolved once (None when unsupported)
+        self._open_change_cwd_modal = getattr(
+            self.im_client, "open_change_cwd_modal", None
+        )
+        # Platform is fixed for the process, so pick the implementation once
+        if self._is_slack:
+            self._get_channel_context = self._get_channel_context_slack
+        else:
+            self._get_channel_context = self._get_channel_context_passthrough
+        # id -> (expires_at, info) for /start lookups
+        self._user_info_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._channel_info_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
 
-    def _get_channel_context(self, context: MessageContext) -> MessageContext:
+    def _get_channel_context_slack(self, context: MessageContext) -> MessageContext:
         """Get context for channel messages (no thread)"""
         # For Slack: send command responses directly to channel, not in thread
-        if self.config.platform == "slack":
-            return MessageContext(
-                user_id=context.user_id,
-                channel_id=context.channel_id,
-                thread_id=None,  # No thread for command responses
-                platform_specific=context.platform_specific,
-            )
-        # For other platforms, keep original context
+        if context.thread_id is not None:
+            # No thread (and no message to edit) for command responses
+            return dataclasses.replace(context, thread_id=None, message_id=None)
         return context
 
-    async def handle_start(self, context: MessageContext, args: str = ""):
-        """Handle /start command with interactive buttons"""
-        platform_name = self.config.platform.capitalize()
+    def _get_channel_context_passthrough(
+        self, context: MessageContext
+    ) -> MessageContext:
+        """Get context for channel messages - other platforms keep the original"""
+        return context
 
-        # Get user and channel info
+    async def _cached_info(self, cache: Dict, key: str, fetch) -> Dict[str, Any]:
+        """Return cached info for key, calling fetch(key) on miss or expiry.
+
+        Errors propagate and evict the entry so the next call retries.
+        """
+        now = time.monotonic()
+        cached = cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+        try:
+            info = await fetch(key)
+        except Exception:
+            cache.pop(key, None)
+            raise
+        cache[key] = (now + INFO_CACHE_TTL, info)
+        return info
+
+    async def _cached_user_info(self, user_id: str) -> Dict[str, Any]:
         try:
-            user_info = await self.im_client.get_user_info(context.user_id)
+            return await self._cached_info(
+                self._user_info_cache, user_id, self.im_client.get_user_info
+            )
         except Exception as e:
             logger.warning(f"Failed to get user info: {e}")
-            user_info = {"id": context.user_id}
+            return {"id": user_id}
 
+    async def _cached_channel_info(self, channel_id: str) -> Dict[str, Any]:
         try:
-            channel_info = await self.im_client.get_channel_info(context.channel_id)
+            return await self._cached_info(
+                self._channel_info_cache, channel_id, self.im_client.get_channel_info
+            )
         except Exception as e:
             logger.warning(f"Failed to get channel info: {e}")
-            channel_info = {
-                "id": context.channel_id,
+            return {
+                "id": channel_id,
                 "name": (
-                    "Direct Message"
-                    if context.channel_id.startswith("D")
-                    else context.channel_id
+                    "Direct Message" if channel_id.startswith("D") else channel_id
                 ),
             }
 
+    async def handle_start(self, context: MessageContext, args: str = ""):
+        """Handle /start command with interactive buttons"""
+        platform_name = self.config.platform.capitalize()
         agent_name = self.controller.resolve_agent_for_context(context)
         default_agent = getattr(self.controller.agent_service, "default_agent", None)
         agent_display_name = get_agent_display_name(
@@ -64,8 +134,8 @@ class CommandHandlers:
         )
 
         # For non-Slack platforms, use traditional text message
-        if self.config.platform != "slack":
-            formatter = self.im_client.formatter
+        if not self._is_slack:
+            formatter = self._formatter
 
             # Build welcome message using formatter to handle escaping properly
             lines = [
@@ -101,29 +171,16 @@ class CommandHandlers:
             await self.im_client.send_message(channel_context, message_text)
             return
 
+        # Get user and channel info concurrently (cached for INFO_CACHE_TTL);
+        # both helpers fall back to defaults instead of raising
+        user_info, channel_info = await asyncio.gather(
+            self._cached_user_info(context.user_id),
+            self._cached_channel_info(context.channel_id),
+        )
+
         # For Slack, create interactive buttons using Block Kit
         user_name = user_info.get("real_name") or user_info.get("name") or "User"
 
-        # Create interactive buttons for commands
-        buttons = [
-            # Row 1: Directory management
-            [
-                InlineButton(text="📁 Current Dir", callback_data="cmd_cwd"),
-                InlineButton(text="📂 Change Work Dir", callback_data="cmd_change_cwd"),
-            ],
-            # Row 2: Session and Settings
-            [
-                InlineButton(text="🔄 Clear All Session", callback_data="cmd_clear"),
-                InlineButton(text="⚙️ Settings", callback_data="cmd_settings"),
-            ],
-            # Row 3: Agent/Model switching
-            [InlineButton(text="🤖 Agent Settings", callback_data="cmd_routing")],
-            # Row 4: Help
-            [InlineButton(text="ℹ️ How it Works", callback_data="info_how_it_works")],
-        ]
-
-        keyboard = InlineKeyboard(buttons=buttons)
-
         welcome_text = f"""🎉 **Welcome to Vibe Remote!**
 
 👋 Hello **{user_name}**!
@@ -137,11 +194,12 @@ Use the buttons below to manage your {agent_display_name} sessions, or simply ty
         # Send command response to channel (not in thread)
         channel_context = self._get_channel_context(context)
         await self.im_client.send_message_with_buttons(
-            channel_context, welcome_text, keyboard
+            channel_context, welcome_text, _START_KEYBOARD
         )
 
     async def handle_clear(self, context: MessageContext, args: str = ""):
         """Handle clear command - clears all sessions across configured agents"""
+        channel_context = self._get_channel_context(context)
         try:
             # Get the correct settings key (channel_id for Slack, not user_id)
             settings_key = self.controller._get_settings_key(context)
@@ -159,14 +217,12 @@ Use the buttons below to manage your {agent_display_name} sessions, or simply ty
                     "✅ Cleared active sessions for:\n" f"{details}\n🔄 All sessions reset."
                 )
 
-            channel_context = self._get_channel_context(context)
             await self.im_client.send_message(channel_context, full_response)
             logger.info(f"Sent clear response to user {context.user_id}")
 
         except Exception as e:
             logger.error(f"Error clearing session: {e}", exc_info=True)
             try:
-                channel_context = self._get_channel_context(context)
                 await self.im_client.send_message(
                     channel_context, f"❌ Error clearing session: {str(e)}"
                 )
@@ -177,19 +233,18 @@ Use the buttons below to manage your {agent_display_name} sessions, or simply ty
 
     async def handle_cwd(self, context: MessageContext, args: str = ""):
         """Handle cwd command - show current working directory"""
+        channel_context = self._get_channel_context(context)
         try:
             # Get CWD based on context (channel/chat)
             absolute_path = self.controller.get_cwd(context)
 
-            # Build response using formatter to avoid escaping issues
-            formatter = self.im_client.formatter
-
-            # Format path properly with code block
-            path_line = f"📁 Current Working Directory:\n{formatter.format_code_inline(absolute_path)}"
+            # Format path properly with code block (formatter handles escaping)
+            path_line = f"📁 Current Working Directory:\n{self._formatter.format_code_inline(absolute_path)}"
 
             # Build status lines
             status_lines = []
-            if os.path.exists(absolute_path):
+            exists, _ = await asyncio.to_thread(_probe_dir, absolute_path)
+            if exists:
                 status_lines.append("✅ Directory exists")
             else:
                 status_lines.append("⚠️ Directory does not exist")
@@ -199,20 +254,18 @@ Use the buttons below to manage your {agent_display_name} sessions, or simply ty
             # Combine all parts
             response_text = path_line + "\n" + "\n".join(status_lines)
 
-            channel_context = self._get_channel_context(context)
             await self.im_client.send_message(channel_context, response_text)
         except Exception as e:
             logger.error(f"Error getting cwd: {e}")
-            channel_context = self._get_channel_context(context)
             await self.im_client.send_message(
                 channel_context, f"Error getting working directory: {str(e)}"
             )
 
     async def handle_set_cwd(self, context: MessageContext, args: str):
         """Handle set_cwd command - change working directory"""
+        channel_context = self._get_channel_context(context)
         try:
             if not args:
-                channel_context = self._get_channel_context(context)
                 await self.im_client.send_message(
                     channel_context, "Usage: /set_cwd <path>"
                 )
@@ -225,22 +278,19 @@ Use the buttons below to manage your {agent_display_name} sessions, or simply ty
             absolute_path = os.path.abspath(expanded_path)
 
             # Check if directory exists
-            if not os.path.exists(absolute_path):
+            exists, is_dir = await asyncio.to_thread(_probe_dir, absolute_path)
+            if not exists:
                 # Try to create it
                 try:
                     os.makedirs(absolute_path, exist_ok=True)
                     logger.info(f"Created directory: {absolute_path}")
                 except Exception as e:
-                    channel_context = self._get_channel_context(context)
                     await self.im_client.send_message(
                         channel_context, f"❌ Cannot create directory: {str(e)}"
                     )
                     return
-
-            if not os.path.isdir(absolute_path):
-                formatter = self.im_client.formatter
-                error_text = f"❌ Path exists but is not a directory: {formatter.format_code_inline(absolute_path)}"
-                channel_context = self._get_channel_context(context)
+            elif not is_dir:
+                error_text = f"❌ Path exists but is not a directory: {self._formatter.format_code_inline(absolute_path)}"
                 await self.im_client.send_message(channel_context, error_text)
                 return
 
@@ -250,26 +300,23 @@ Use the buttons below to manage your {agent_display_name} sessions, or simply ty
 
             logger.info(f"User {context.user_id} changed cwd to: {absolute_path}")
 
-            formatter = self.im_client.formatter
             response_text = (
                 f"✅ Working directory changed to:\n"
-                f"{formatter.format_code_inline(absolute_path)}"
+                f"{self._formatter.format_code_inline(absolute_path)}"
             )
-            channel_context = self._get_channel_context(context)
             await self.im_client.send_message(channel_context, response_text)
 
         except Exception as e:
             logger.error(f"Error setting cwd: {e}")
-            channel_context = self._get_channel_context(context)
             await self.im_client.send_message(
                 channel_context, f"❌ Error setting working directory: {str(e)}"
             )
 
     async def handle_change_cwd_modal(self, context: MessageContext):
         """Handle Change Work Dir button - open modal for Slack"""
-        if self.config.platform != "slack":
+        channel_context = self._get_channel_context(context)
+        if not self._is_slack:
             # For non-Slack platforms, just send instructions
-            channel_context = self._get_channel_context(context)
             await self.im_client.send_message(
                 channel_context,
                 "📂 To change working directory, use:\n`/set_cwd <path>`\n\nExample:\n`/set_cwd ~/projects/myapp`",
@@ -283,24 +330,22 @@ Use the buttons below to manage your {agent_display_name} sessions, or simply ty
             else None
         )
 
-        if trigger_id and hasattr(self.im_client, "open_change_cwd_modal"):
+        if trigger_id and self._open_change_cwd_modal is not None:
             try:
                 # Get current CWD based on context
                 current_cwd = self.controller.get_cwd(context)
 
-                await self.im_client.open_change_cwd_modal(
+                await self._open_change_cwd_modal(
                     trigger_id, current_cwd, context.channel_id
                 )
             except Exception as e:
                 logger.error(f"Error opening change CWD modal: {e}")
-                channel_context = self._get_channel_context(context)
                 await self.im_client.send_message(
                     channel_context,
                     "❌ Failed to open directory change dialog. Please try again.",
                 )
         else:
             # No trigger_id, show instructions
-            channel_context = self._get_channel_context(context)
             await self.im_client.send_message(
                 channel_context,
                 "📂 Click the 'Change Work Dir' button in the /start menu to change working directory.",
@@ -309,19 +354,8 @@ Use the buttons below to manage your {agent_display_name} sessions, or simply ty
     async def handle_stop(self, context: MessageContext, args: str = ""):
         """Handle /stop command - send interrupt message to the active agent"""
         try:
-            session_handler = self.controller.session_handler
-            base_session_id, working_path, composite_key = (
-                session_handler.get_session_info(context)
-            )
-            settings_key = self.controller._get_settings_key(context)
-            agent_name = self.controller.resolve_agent_for_context(context)
-            request = AgentRequest(
-                context=context,
-                message="stop",
-                working_path=working_path,
-                base_session_id=base_session_id,
-                composite_session_id=composite_key,
-                settings_key=settings_key,
+            agent_name, request = self.controller.session_handler.build_agent_request(
+                context, "stop"
             )
 
             handled = await self.controller.agent_service.handle_stop(
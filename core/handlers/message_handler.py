@@ -1,13 +1,19 @@
 """Message routing and Agent communication handlers"""
 
+import asyncio
+import dataclasses
 import logging
-from typing import Optional
+import re
+from typing import Dict, Optional
 
 from modules.agents import AgentRequest
 from modules.im import MessageContext
 
 logger = logging.getLogger(__name__)
 
+# Messages that act as an inline /stop inside a thread
+_STOP_TOKENS = frozenset({"stop", "/stop"})
+
 
 class MessageHandler:
     """Handles message routing and Claude communication"""
@@ -21,7 +27,35 @@ class MessageHandler:
         self.settings_manager = controller.settings_manager
         self.formatter = controller.im_client.formatter
         self.session_handler = None  # Will be set after creation
-        self.receiver_tasks = controller.receiver_tasks
+        # Optional IM capability, resolved once (None when unsupported)
+        self._delete_message = getattr(self.im_client, "delete_message", None)
+        # agent label -> acknowledgement text (closed, tiny set)
+        self._ack_texts: Dict[str, str] = {}
+        # Legacy toggle hook, if the settings handler still provides one
+        self._handle_toggle_setting = getattr(
+            controller.settings_handler, "handle_toggle_setting", None
+        )
+
+        # Callback routing; command/settings handlers are created before us
+        command_handler = controller.command_handler
+        settings_handler = controller.settings_handler
+        self._callback_dispatch = {
+            "info_msg_types": settings_handler.handle_info_message_types,
+            "info_how_it_works": settings_handler.handle_info_how_it_works,
+            "cmd_cwd": command_handler.handle_cwd,
+            "cmd_change_cwd": command_handler.handle_change_cwd_modal,
+            "cmd_clear": command_handler.handle_clear,
+            "cmd_settings": settings_handler.handle_settings,
+            "cmd_routing": settings_handler.handle_routing,
+        }
+        self._callback_prefix_dispatch = {
+            "toggle_msg_": settings_handler.handle_toggle_message_type,
+            "toggle_": self._handle_legacy_toggle,
+            "info_": self._handle_generic_info,
+        }
+        # One match picks the prefix; longest first so "toggle_msg_" wins
+        prefixes = sorted(self._callback_prefix_dispatch, key=len, reverse=True)
+        self._callback_prefix_re = re.compile("|".join(map(re.escape, prefixes)))
 
     def set_session_handler(self, session_handler):
         """Set reference to session handler"""
@@ -33,73 +67,41 @@ class MessageHandler:
 
     def _get_target_context(self, context: MessageContext) -> MessageContext:
         """Get target context for sending messages"""
-        # For Slack, use thread for replies if enabled
-        if self.im_client.should_use_thread_for_reply() and context.thread_id:
-            return MessageContext(
-                user_id=context.user_id,
-                channel_id=context.channel_id,
-                thread_id=context.thread_id,
-                message_id=context.message_id,
-                platform_specific=context.platform_specific,
-            )
+        # For Slack, thread replies reuse the incoming thread_id, which the
+        # context already carries, so no copy is needed on any platform
         return context
 
     async def handle_user_message(self, context: MessageContext, message: str):
         """Process regular user messages and route to configured agent"""
         try:
-            # Safe cleanup: only remove completed receiver tasks when enabled
-            if getattr(self.config, "cleanup_enabled", False):
-                try:
-                    completed_keys = [
-                        key
-                        for key, task in list(self.receiver_tasks.items())
-                        if task.done()
-                    ]
-                    for key in completed_keys:
-                        del self.receiver_tasks[key]
-                        logger.info(
-                            f"Safely cleaned completed receiver task for session {key}"
-                        )
-                except Exception as cleanup_err:
-                    logger.debug(f"Safe cleanup skipped due to error: {cleanup_err}")
+            # Completed receiver tasks remove themselves via a done-callback
+            # (ClaudeAgent._evict_receiver_task), so no scan is needed here
 
-            # Allow "stop" shortcut inside Slack threads
-            if context.thread_id and message.strip().lower() in ["stop", "/stop"]:
-                if await self._handle_inline_stop(context):
-                    return
-
-            base_session_id, working_path, composite_key = (
-                self.session_handler.get_session_info(context)
+            # Resolved once; the inline stop shortcut reuses the same routing
+            agent_name, request = self.session_handler.build_agent_request(
+                context, message
             )
-            settings_key = self._get_settings_key(context)
 
-            agent_name = self.controller.resolve_agent_for_context(context)
+            # Allow "stop" shortcut inside Slack threads
+            if context.thread_id and message.strip().lower() in _STOP_TOKENS:
+                stop_request = dataclasses.replace(request, message="stop")
+                if await self._handle_inline_stop(context, agent_name, stop_request):
+                    return
             ack_context = self._get_target_context(context)
             ack_text = self._get_ack_text(agent_name)
-            ack_message_id = None
-            try:
-                ack_message_id = await self.im_client.send_message(
-                    ack_context, ack_text
-                )
-            except Exception as ack_err:
-                logger.debug(f"Failed to send ack message: {ack_err}")
-
-            request = AgentRequest(
-                context=context,
-                message=message,
-                working_path=working_path,
-                base_session_id=base_session_id,
-                composite_session_id=composite_key,
-                settings_key=settings_key,
-                ack_message_id=ack_message_id,
+
+            # Send the ack concurrently so its round trip doesn't delay the agent;
+            # whoever deletes the ack claims it through request.take_ack_id()
+            ack_task = asyncio.create_task(
+                self._send_ack(ack_context, ack_text, request)
             )
+            request.ack_task = ack_task
             try:
                 await self.controller.agent_service.handle_message(agent_name, request)
             except KeyError:
                 await self._handle_missing_agent(context, agent_name)
             finally:
-                if request.ack_message_id:
-                    await self._delete_ack(context.channel_id, request)
+                await self._delete_ack(context.channel_id, request)
         except Exception as e:
             logger.error(f"Error processing user message: {e}", exc_info=True)
             await self.im_client.send_message(
@@ -113,66 +115,22 @@ class MessageHandler:
                 f"handle_callback_query called with data: {callback_data} for user {context.user_id}"
             )
 
-            # Import handlers to avoid circular dependency
-            from .settings_handler import SettingsHandler
-            from .command_handlers import CommandHandlers
-
-            settings_handler = SettingsHandler(self.controller)
-            command_handlers = CommandHandlers(self.controller)
-
-            # Route based on callback data
-            if callback_data.startswith("toggle_msg_"):
-                # Toggle message type visibility
-                msg_type = callback_data.replace("toggle_msg_", "")
-                await settings_handler.handle_toggle_message_type(context, msg_type)
-            elif callback_data.startswith("toggle_"):
-                # Legacy toggle handler (if any)
-                setting_type = callback_data.replace("toggle_", "")
-                if hasattr(settings_handler, "handle_toggle_setting"):
-                    await settings_handler.handle_toggle_setting(context, setting_type)
-
-            elif callback_data == "info_msg_types":
-                logger.info(
-                    f"Handling info_msg_types callback for user {context.user_id}"
-                )
-                await settings_handler.handle_info_message_types(context)
-
-            elif callback_data == "info_how_it_works":
-                await settings_handler.handle_info_how_it_works(context)
-
-            elif callback_data == "cmd_cwd":
-                await command_handlers.handle_cwd(context)
-
-            elif callback_data == "cmd_change_cwd":
-                await command_handlers.handle_change_cwd_modal(context)
-
-            elif callback_data == "cmd_clear":
-                await command_handlers.handle_clear(context)
+            handler = self._callback_dispatch.get(callback_data)
+            if handler is not None:
+                await handler(context)
+                return
 
-            elif callback_data == "cmd_settings":
-                await settings_handler.handle_settings(context)
+            match = self._callback_prefix_re.match(callback_data)
+            if match:
+                prefix_handler = self._callback_prefix_dispatch[match.group()]
+                await prefix_handler(context, callback_data[match.end() :])
+                return
 
-            elif callback_data == "cmd_routing":
-                await settings_handler.handle_routing(context)
-
-            elif (
-                callback_data.startswith("info_") and callback_data != "info_msg_types"
-            ):
-                # Generic info handler
-                info_type = callback_data.replace("info_", "")
-                info_text = self.formatter.format_info_message(
-                    title=f"Info: {info_type}",
-                    emoji="ℹ️",
-                    footer="This feature is coming soon!",
-                )
-                await self.im_client.send_message(context, info_text)
-
-            else:
-                logger.warning(f"Unknown callback data: {callback_data}")
-                await self.im_client.send_message(
-                    context,
-                    self.formatter.format_warning(f"Unknown action: {callback_data}"),
-                )
+            logger.warning(f"Unknown callback data: {callback_data}")
+            await self.im_client.send_message(
+                context,
+                self.formatter.format_warning(f"Unknown action: {callback_data}"),
+            )
 
         except Exception as e:
             logger.error(f"Error handling callback query: {e}", exc_info=True)
@@ -181,22 +139,32 @@ class MessageHandler:
                 self.formatter.format_error(f"Error processing action: {str(e)}"),
             )
 
-    async def _handle_inline_stop(self, context: MessageContext) -> bool:
+    async def _handle_legacy_toggle(self, context: MessageContext, setting_type: str):
+        """Legacy toggle handler (if any)"""
+        if self._handle_toggle_setting is not None:
+            await self._handle_toggle_setting(context, setting_type)
+
+    async def _handle_generic_info(self, context: MessageContext, info_type: str):
+        """Generic info handler for info_* callbacks without a dedicated page"""
+        info_text = self.formatter.format_info_message(
+            title=f"Info: {info_type}",
+            emoji="ℹ️",
+            footer="This feature is coming soon!",
+        )
+        await self.im_client.send_message(context, info_text)
+
+    async def _handle_inline_stop(
+        self,
+        context: MessageContext,
+        agent_name: Optional[str] = None,
+        request: Optional[AgentRequest] = None,
+    ) -> bool:
         """Route inline 'stop' messages to the active agent."""
         try:
-            base_session_id, working_path, composite_key = (
-                self.session_handler.get_session_info(context)
-            )
-            settings_key = self._get_settings_key(context)
-            agent_name = self.controller.resolve_agent_for_context(context)
-            request = AgentRequest(
-                context=context,
-                message="stop",
-                working_path=working_path,
-                base_session_id=base_session_id,
-                composite_session_id=composite_key,
-                settings_key=settings_key,
-            )
+            if request is None:
+                agent_name, request = self.session_handler.build_agent_request(
+                    context, "stop"
+                )
             try:
                 handled = await self.controller.agent_service.handle_stop(
                     agent_name, request
@@ -223,17 +191,30 @@ class MessageHandler:
         )
         await self.im_client.send_message(context, msg)
 
+    async def _send_ack(
+        self, context: MessageContext, text: str, request: AgentRequest
+    ):
+        """Send acknowledgement message and record its id on the request."""
+        try:
+            request.ack_message_id = await self.im_client.send_message(context, text)
+        except Exception as ack_err:
+            logger.debug(f"Failed to send ack message: {ack_err}")
+
     async def _delete_ack(self, channel_id: str, request: AgentRequest):
-        """Delete acknowledgement message if it still exists."""
-        if request.ack_message_id and hasattr(self.im_client, "delete_message"):
+        """Delete acknowledgement message unless an agent already claimed it."""
+        ack_id = await request.take_ack_id()
+        if ack_id and self._delete_message is not None:
             try:
-                await self.im_client.delete_message(channel_id, request.ack_message_id)
+                await self._delete_message(channel_id, ack_id)
             except Exception as err:
                 logger.debug(f"Failed to delete ack message: {err}")
-            finally:
-                request.ack_message_id = None
 
     def _get_ack_text(self, agent_name: str) -> str:
         """Unified acknowledgement text before agent processing."""
         label = agent_name or self.controller.agent_service.default_agent
-        return f"📨 {label.capitalize()} received, processing..."
+        text = self._ack_texts.get(label)
+        if text is None:
+            text = self._ack_texts[label] = (
+                f"📨 {label.capitalize()} received, processing..."
+            )
+        return text
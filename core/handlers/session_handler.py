@@ -1,14 +1,25 @@
 """Session management handlers for Claude SDK sessions"""
 
+import asyncio
 import os
 import logging
+from dataclasses import dataclass
 from typing import Optional, Dict, Any, Tuple
+from modules.agents import AgentRequest
 from modules.im import MessageContext
 from claude_code_sdk import ClaudeSDKClient, ClaudeCodeOptions
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class ClaudeSession:
+    """Live Claude SDK client and its background receiver for one composite key"""
+
+    client: ClaudeSDKClient
+    receiver_task: Optional[asyncio.Task] = None
+
+
 class SessionHandler:
     """Handles all session-related operations"""
     
@@ -21,8 +32,9 @@ class SessionHandler:
         self.settings_manager = controller.settings_manager
         self.formatter = controller.im_client.formatter
         self.claude_sessions = controller.claude_sessions
-        self.receiver_tasks = controller.receiver_tasks
-        self.stored_session_mappings = controller.stored_session_mappings
+        # Platform is fixed per process; base session ids are "<platform>_<id>"
+        self._platform = self.config.platform
+        self._base_session_prefix = f"{self._platform}_"
     
     def _get_settings_key(self, context: MessageContext) -> str:
         """Get settings key - delegate to controller"""
@@ -30,51 +42,91 @@ class SessionHandler:
     
     def get_base_session_id(self, context: MessageContext) -> str:
         """Get base session ID based on platform and context (without path)"""
-        if self.config.platform == "telegram":
+        if self._platform == "telegram":
             # For Telegram, use channel/chat ID
-            return f"telegram_{context.channel_id}"
-        elif self.config.platform == "slack":
-            # For Slack, always use thread ID (now always available)
-            return f"slack_{context.thread_id}"
+            return self._base_session_prefix + context.channel_id
+        elif self._platform == "slack":
+            # For Slack, always use thread ID (now always available); slash
+            # commands carry none, and keep mapping to "slack_None" as before
+            return self._base_session_prefix + str(context.thread_id)
         else:
             # Default to user ID
-            return f"{self.config.platform}_{context.user_id}"
+            return self._base_session_prefix + context.user_id
     
-    def get_working_path(self, context: MessageContext) -> str:
+    def get_working_path(
+        self, context: MessageContext, settings_key: Optional[str] = None
+    ) -> str:
         """Get working directory - delegate to controller's get_cwd"""
-        return self.controller.get_cwd(context)
+        return self.controller.get_cwd(context, settings_key)
     
-    def get_session_info(self, context: MessageContext) -> Tuple[str, str, str]:
+    def get_session_info(
+        self, context: MessageContext, settings_key: Optional[str] = None
+    ) -> Tuple[str, str, str]:
         """Get session info: base_session_id, working_path, and composite_key"""
         base_session_id = self.get_base_session_id(context)
-        working_path = self.get_working_path(context)  # Pass context to get user's custom_cwd
+        working_path = self.get_working_path(context, settings_key)  # Pass context to get user's custom_cwd
         # Create composite key for internal storage
         composite_key = f"{base_session_id}:{working_path}"
         return base_session_id, working_path, composite_key
+
+    def build_agent_request(
+        self, context: MessageContext, message: str
+    ) -> Tuple[str, AgentRequest]:
+        """Resolve the target agent and build its request in one pass.
+
+        The settings key is computed once and shared by the cwd lookup and
+        agent routing. Returns (agent_name, request).
+        """
+        settings_key = self._get_settings_key(context)
+        base_session_id, working_path, composite_key = self.get_session_info(
+            context, settings_key
+        )
+        agent_name = self.controller.resolve_agent_for_context(context, settings_key)
+        request = AgentRequest(
+            context=context,
+            message=message,
+            working_path=working_path,
+            base_session_id=base_session_id,
+            composite_session_id=composite_key,
+            settings_key=settings_key,
+        )
+        return agent_name, request
     
-    async def get_or_create_claude_session(self, context: MessageContext) -> ClaudeSDKClient:
-        """Get existing Claude session or create a new one"""
-        base_session_id, working_path, composite_key = self.get_session_info(context)
+    async def get_or_create_claude_session(
+        self,
+        context: MessageContext,
+        session_info: Optional[Tuple[str, str, str]] = None,
+        settings_key: Optional[str] = None,
+    ) -> ClaudeSDKClient:
+        """Get existing Claude session or create a new one
+
+        Callers that already resolved the session (e.g. from an AgentRequest)
+        can pass session_info and settings_key to skip recomputing them.
+        """
+        if session_info is None:
+            session_info = self.get_session_info(context, settings_key)
+        base_session_id, working_path, composite_key = session_info
         
-        if composite_key in self.claude_sessions:
+        session = self.claude_sessions.get(composite_key)
+        if session is not None:
             logger.info(f"Using existing Claude SDK client for {base_session_id} at {working_path}")
-            return self.claude_sessions[composite_key]
+            return session.client
         
         # Check if we have a stored session mapping
         # Get correct settings key based on platform
-        settings_key = self._get_settings_key(context)
+        if settings_key is None:
+            settings_key = self._get_settings_key(context)
         stored_claude_session_id = self.settings_manager.get_claude_session_id(
             settings_key, base_session_id, working_path
         )
         
         # Ensure working directory exists
-        if not os.path.exists(working_path):
-            try:
-                os.makedirs(working_path, exist_ok=True)
-                logger.info(f"Created working directory: {working_path}")
-            except Exception as e:
-                logger.error(f"Failed to create working directory {working_path}: {e}")
-                working_path = os.getcwd()
+        # exist_ok makes a separate exists() probe redundant
+        try:
+            await asyncio.to_thread(os.makedirs, working_path, exist_ok=True)
+        except OSError as e:
+            logger.error(f"Failed to create working directory {working_path}: {e}")
+            working_path = os.getcwd()
         
         # Create options for Claude client
         options = ClaudeCodeOptions(
@@ -84,60 +136,54 @@ class SessionHandler:
             resume=stored_claude_session_id if stored_claude_session_id else None
         )
         
-        # Log session creation details
-        logger.info(f"Creating Claude client for {base_session_id} at {working_path}")
-        logger.info(f"  Working directory: {working_path}")
-        logger.info(f"  Resume session ID: {stored_claude_session_id}")
-        logger.info(f"  Options.resume: {options.resume}")
-        
-        # Log if we're resuming a session
-        if stored_claude_session_id:
-            logger.info(f"Attempting to resume Claude session {stored_claude_session_id}")
-        else:
-            logger.info(f"Creating new Claude session")
-        
+        # Log session creation details as one record; %-args defer formatting
+        logger.info(
+            "Creating Claude client for %s (%s session): %s",
+            base_session_id,
+            "resuming" if stored_claude_session_id else "new",
+            {
+                "cwd": options.cwd,
+                "permission_mode": options.permission_mode,
+                "system_prompt": options.system_prompt,
+                "resume": options.resume,
+                "continue_conversation": options.continue_conversation,
+            },
+        )
+
         # Create new Claude client
         client = ClaudeSDKClient(options=options)
-        
-        # Log the actual options being used
-        logger.info(f"ClaudeCodeOptions details:")
-        logger.info(f"  - permission_mode: {options.permission_mode}")
-        logger.info(f"  - cwd: {options.cwd}")
-        logger.info(f"  - system_prompt: {options.system_prompt}")
-        logger.info(f"  - resume: {options.resume}")
-        logger.info(f"  - continue_conversation: {options.continue_conversation}")
-        
+
         # Connect the client
         await client.connect()
         
-        self.claude_sessions[composite_key] = client
+        self.claude_sessions[composite_key] = ClaudeSession(client=client)
         logger.info(f"Created new Claude SDK client for {base_session_id} at {working_path}")
         
         return client
     
     async def cleanup_session(self, composite_key: str):
         """Clean up a specific session by composite key"""
+        session = self.claude_sessions.pop(composite_key, None)
+        if session is None:
+            return
+
         # Cancel receiver task if exists
-        if composite_key in self.receiver_tasks:
-            task = self.receiver_tasks[composite_key]
+        task = session.receiver_task
+        if task is not None:
             if not task.done():
                 task.cancel()
-                try:
-                    await task
-                except Exception:
-                    pass
-            del self.receiver_tasks[composite_key]
+                # wait() doesn't re-raise the receiver's CancelledError or
+                # error, so only cancellation of this cleanup itself propagates
+                await asyncio.wait((task,))
+            session.receiver_task = None
             logger.info(f"Cancelled receiver task for session {composite_key}")
         
         # Cleanup Claude session
-        if composite_key in self.claude_sessions:
-            client = self.claude_sessions[composite_key]
-            try:
-                await client.disconnect()
-            except Exception as e:
-                logger.error(f"Error disconnecting Claude session {composite_key}: {e}")
-            del self.claude_sessions[composite_key]
-            logger.info(f"Cleaned up Claude session {composite_key}")
+        try:
+            await session.client.disconnect()
+        except Exception as e:
+            logger.error(f"Error disconnecting Claude session {composite_key}: {e}")
+        logger.info(f"Cleaned up Claude session {composite_key}")
     
     async def handle_session_error(self, composite_key: str, context: MessageContext, error: Exception):
         """Handle session-related errors"""
@@ -188,23 +234,31 @@ class SessionHandler:
         # Get all user settings
         all_settings = self.settings_manager.settings
         
-        restored_count = 0
-        for user_id, user_settings in all_settings.items():
-            if (
-                hasattr(user_settings, "session_mappings")
-                and user_settings.session_mappings
-                and "claude" in user_settings.session_mappings
-            ):
-                claude_map = user_settings.session_mappings["claude"]
+        claude_maps = [
+            (user_id, user_settings.session_mappings["claude"])
+            for user_id, user_settings in all_settings.items()
+            if getattr(user_settings, "session_mappings", None)
+            and "claude" in user_settings.session_mappings
+        ]
+        restored_count = sum(
+            len(path_mappings)
+            for _, claude_map in claude_maps
+            for path_mappings in claude_map.values()
+            if isinstance(path_mappings, dict)
+        )
+
+        # Per-mapping details are only worth formatting when DEBUG is on
+        if logger.isEnabledFor(logging.DEBUG):
+            for user_id, claude_map in claude_maps:
                 for base_session_id, path_mappings in claude_map.items():
-                    if isinstance(path_mappings, dict):
-                        logger.info(
-                            f"Found {len(path_mappings)} path mappings for {base_session_id} (user {user_id})"
+                    if not isinstance(path_mappings, dict):
+                        continue
+                    logger.debug(
+                        f"Found {len(path_mappings)} path mappings for {base_session_id} (user {user_id})"
+                    )
+                    for path, claude_session_id in path_mappings.items():
+                        logger.debug(
+                            f"  - {base_session_id}[{path}] -> {claude_session_id}"
                         )
-                        for path, claude_session_id in path_mappings.items():
-                            logger.info(
-                                f"  - {base_session_id}[{path}] -> {claude_session_id}"
-                            )
-                            restored_count += 1
 
         logger.info(f"Session restoration complete. Restored {restored_count} session mappings.")
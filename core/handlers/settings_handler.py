@@ -1,11 +1,28 @@
 """Settings and configuration handlers"""
 
 import logging
+from typing import Dict, FrozenSet
 from modules.agents import get_agent_display_name
 from modules.im import MessageContext, InlineKeyboard, InlineButton
 
 logger = logging.getLogger(__name__)
 
+# Static "open modal" prompts (Slack); built once and shared
+_OPEN_SETTINGS_KEYBOARD = InlineKeyboard(
+    buttons=[
+        [InlineButton(text="🛠️ Open Settings", callback_data="open_settings_modal")]
+    ]
+)
+_OPEN_ROUTING_KEYBOARD = InlineKeyboard(
+    buttons=[
+        [
+            InlineButton(
+                text="🤖 Open Agent Settings", callback_data="open_routing_modal"
+            )
+        ]
+    ]
+)
+
 
 class SettingsHandler:
     """Handles settings and configuration operations"""
@@ -17,6 +34,12 @@ class SettingsHandler:
         self.im_client = controller.im_client
         self.settings_manager = controller.settings_manager
         self.formatter = controller.im_client.formatter
+        # Optional IM capability, resolved once (None when unsupported)
+        self._open_settings_modal = getattr(
+            self.im_client, "open_settings_modal", None
+        )
+        # hidden message types -> settings keyboard (at most 2**len(types))
+        self._message_types_keyboards: Dict[FrozenSet[str], InlineKeyboard] = {}
 
     def _get_settings_key(self, context: MessageContext) -> str:
         """Get settings key - delegate to controller"""
@@ -28,30 +51,14 @@ class SettingsHandler:
         default_agent = getattr(self.controller.agent_service, "default_agent", None)
         return get_agent_display_name(agent_name, fallback=default_agent)
 
-    async def handle_settings(self, context: MessageContext, args: str = ""):
-        """Handle settings command - show settings menu"""
-        try:
-            # For Slack, use modal dialog
-            if self.config.platform == "slack":
-                await self._handle_settings_slack(context)
-            else:
-                # For other platforms, use inline keyboard
-                await self._handle_settings_traditional(context)
-
-        except Exception as e:
-            logger.error(f"Error showing settings: {e}")
-            await self.im_client.send_message(
-                context, f"❌ Error showing settings: {str(e)}"
-            )
-
-    async def _handle_settings_traditional(self, context: MessageContext):
-        """Handle settings for non-Slack platforms (Telegram, etc)"""
-        # Get current settings
-        settings_key = self._get_settings_key(context)
-        user_settings = self.settings_manager.get_user_settings(settings_key)
-
-        # Get available message types and display names
+    def _get_message_types_keyboard(self, hidden_types) -> InlineKeyboard:
+        """Message visibility keyboard for the given hidden types, memoized"""
         message_types = self.settings_manager.get_available_message_types()
+        hidden = frozenset(mt for mt in message_types if mt in hidden_types)
+        keyboard = self._message_types_keyboards.get(hidden)
+        if keyboard is not None:
+            return keyboard
+
         display_names = self.settings_manager.get_message_type_display_names()
 
         # Create inline keyboard buttons in 2x2 layout
@@ -59,8 +66,7 @@ class SettingsHandler:
         row = []
 
         for i, msg_type in enumerate(message_types):
-            is_hidden = msg_type in user_settings.hidden_message_types
-            checkbox = "☑️" if is_hidden else "⬜"
+            checkbox = "☑️" if msg_type in hidden else "⬜"
             display_name = display_names.get(msg_type, msg_type)
             button = InlineButton(
                 text=f"{checkbox} Hide {display_name}",
@@ -79,6 +85,33 @@ class SettingsHandler:
         )
 
         keyboard = InlineKeyboard(buttons=buttons)
+        self._message_types_keyboards[hidden] = keyboard
+        return keyboard
+
+    async def handle_settings(self, context: MessageContext, args: str = ""):
+        """Handle settings command - show settings menu"""
+        try:
+            # For Slack, use modal dialog
+            if self.config.platform == "slack":
+                await self._handle_settings_slack(context)
+            else:
+                # For other platforms, use inline keyboard
+                await self._handle_settings_traditional(context)
+
+        except Exception as e:
+            logger.error(f"Error showing settings: {e}")
+            await self.im_client.send_message(
+                context, f"❌ Error showing settings: {str(e)}"
+            )
+
+    async def _handle_settings_traditional(self, context: MessageContext):
+        """Handle settings for non-Slack platforms (Telegram, etc)"""
+        # Get current settings
+        settings_key = self._get_settings_key(context)
+        user_settings = self.settings_manager.get_user_settings(settings_key)
+        keyboard = self._get_message_types_keyboard(
+            user_settings.hidden_message_types
+        )
 
         # Send settings message with escaped dash
         agent_label = self._get_agent_display_name(context)
@@ -97,7 +130,7 @@ class SettingsHandler:
             else None
         )
 
-        if trigger_id and hasattr(self.im_client, "open_settings_modal"):
+        if trigger_id and self._open_settings_modal is not None:
             # We have trigger_id, open modal directly
             settings_key = self._get_settings_key(context)
             user_settings = self.settings_manager.get_user_settings(settings_key)
@@ -105,7 +138,7 @@ class SettingsHandler:
             display_names = self.settings_manager.get_message_type_display_names()
 
             try:
-                await self.im_client.open_settings_modal(
+                await self._open_settings_modal(
                     trigger_id,
                     user_settings,
                     message_types,
@@ -119,20 +152,10 @@ class SettingsHandler:
                 )
         else:
             # No trigger_id, show button to open modal
-            buttons = [
-                [
-                    InlineButton(
-                        text="🛠️ Open Settings", callback_data="open_settings_modal"
-                    )
-                ]
-            ]
-
-            keyboard = InlineKeyboard(buttons=buttons)
-
             await self.im_client.send_message_with_buttons(
                 context,
                 f"⚙️ *Personalization Settings*\n\nConfigure how {self._get_agent_display_name(context)} messages appear in your Slack workspace.",
-                keyboard,
+                _OPEN_SETTINGS_KEYBOARD,
             )
 
     async def handle_toggle_message_type(self, context: MessageContext, msg_type: str):
@@ -146,33 +169,11 @@ class SettingsHandler:
 
             # Update the keyboard
             user_settings = self.settings_manager.get_user_settings(settings_key)
-            message_types = self.settings_manager.get_available_message_types()
             display_names = self.settings_manager.get_message_type_display_names()
-
-            buttons = []
-            row = []
-
-            for i, mt in enumerate(message_types):
-                is_hidden_now = mt in user_settings.hidden_message_types
-                checkbox = "☑️" if is_hidden_now else "⬜"
-                display_name = display_names.get(mt, mt)
-                button = InlineButton(
-                    text=f"{checkbox} Hide {display_name}",
-                    callback_data=f"toggle_msg_{mt}",
-                )
-                row.append(button)
-
-                # Create 2x2 layout
-                if len(row) == 2 or i == len(message_types) - 1:
-                    buttons.append(row)
-                    row = []
-
-            buttons.append(
-                [InlineButton("ℹ️ About Message Types", callback_data="info_msg_types")]
+            keyboard = self._get_message_types_keyboard(
+                user_settings.hidden_message_types
             )
 
-            keyboard = InlineKeyboard(buttons=buttons)
-
             # Update message
             if context.message_id:
                 await self.im_client.edit_message(
@@ -288,19 +289,10 @@ class SettingsHandler:
 
         if not trigger_id:
             # No trigger_id, show button to open modal
-            buttons = [
-                [
-                    InlineButton(
-                        text="🤖 Open Agent Settings",
-                        callback_data="open_routing_modal",
-                    )
-                ]
-            ]
-            keyboard = InlineKeyboard(buttons=buttons)
             await self.im_client.send_message_with_buttons(
                 context,
                 "🤖 *Agent & Model Settings*\n\nConfigure which backend to use for this channel.",
-                keyboard,
+                _OPEN_ROUTING_KEYBOARD,
             )
             return
 
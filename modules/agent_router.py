@@ -71,8 +71,9 @@ class AgentRouter:
                     "PyYAML is required to parse YAML agent route files. "
                     "Install with `pip install pyyaml` or use JSON."
                 ) from exc
+            loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
             with open(path, "r") as f:
-                return yaml.safe_load(f) or {}
+                return yaml.load(f, Loader=loader) or {}
         with open(path, "r") as f:
             return json.load(f)
 
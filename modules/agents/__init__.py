@@ -6,20 +6,21 @@ from .codex_agent import CodexAgent
 from .opencode_agent import OpenCodeAgent
 from .service import AgentService
 
+# Lowercase agent name -> display name for the built-in backends
+_AGENT_DISPLAY_NAMES = {
+    "claude": "Claude",
+    "codex": "Codex",
+    "opencode": "OpenCode",
+}
 
-def get_agent_display_name(agent_name: Optional[str], fallback: Optional[str] = None) -> str:
-    normalized_map = {
-        "claude": "Claude",
-        "codex": "Codex",
-        "opencode": "OpenCode",
-    }
 
+def get_agent_display_name(agent_name: Optional[str], fallback: Optional[str] = None) -> str:
     candidate = (agent_name or fallback or "Agent").strip()
     if not candidate:
         candidate = "Agent"
 
     normalized = candidate.lower()
-    friendly = normalized_map.get(normalized)
+    friendly = _AGENT_DISPLAY_NAMES.get(normalized)
     if friendly:
         return friendly
 
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import asyncio
 import time
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
@@ -10,7 +11,7 @@ from typing import Any, Dict, Optional
 from modules.im import MessageContext
 
 
-@dataclass
+@dataclass(slots=True)
 class AgentRequest:
     """Normalized agent invocation request."""
 
@@ -21,12 +22,25 @@ class AgentRequest:
     composite_session_id: str
     settings_key: str
     ack_message_id: Optional[str] = None
+    # Pending ack send (started concurrently with dispatch); sets ack_message_id
+    ack_task: Optional[asyncio.Task] = None
     last_agent_message: Optional[str] = None
     last_agent_message_parse_mode: Optional[str] = None
     started_at: float = field(default_factory=time.monotonic)
 
+    async def take_ack_id(self) -> Optional[str]:
+        """Wait for the ack send to finish, then claim its id.
 
-@dataclass
+        This is the only place the id is claimed, so whichever caller gets
+        here first deletes the ack and every later caller gets None.
+        """
+        if self.ack_task is not None:
+            await self.ack_task
+        ack_id, self.ack_message_id = self.ack_message_id, None
+        return ack_id
+
+
+@dataclass(slots=True)
 class AgentMessage:
     """Normalized message emitted by an agent implementation."""
 
@@ -46,6 +60,12 @@ class BaseAgent(ABC):
         self.config = controller.config
         self.im_client = controller.im_client
         self.settings_manager = controller.settings_manager
+        # Optional IM capability, resolved once (None when unsupported)
+        self._delete_message = getattr(self.im_client, "delete_message", None)
+        # Slack separates agent messages with a rule; platform is fixed per process
+        is_slack = self.config.platform == "slack"
+        self._result_suffix: Optional[str] = "---" if is_slack else None
+        self._message_tail = "\n---" if is_slack else ""
 
     def _calculate_duration_ms(self, started_at: Optional[float]) -> int:
         if not started_at:
@@ -1,15 +1,49 @@
 import asyncio
+import functools
 import logging
 import os
+from collections import OrderedDict
 from typing import Callable, Optional
 
-from claude_code_sdk import TextBlock
+from claude_code_sdk import (
+    AssistantMessage,
+    ResultMessage,
+    SystemMessage,
+    TextBlock,
+    UserMessage,
+)
 
 from modules.agents.base import AgentRequest, BaseAgent
 from modules.im import MessageContext
 
 logger = logging.getLogger(__name__)
 
+# Cap on remembered assistant texts (result fallbacks); the oldest is evicted
+LAST_ASSISTANT_TEXT_MAX = 512
+
+# Distinct tool paths memoized per receive loop
+RELATIVE_PATH_CACHE_SIZE = 1024
+
+# Claude SDK message class -> message type name used by settings/emits
+_MESSAGE_TYPES = {
+    SystemMessage: "system",
+    UserMessage: "user",
+    AssistantMessage: "assistant",
+    ResultMessage: "result",
+}
+
+
+def _relative_path(cwd: str, abs_path: str) -> str:
+    """Path relative to cwd, or absolute when it would climb out two levels."""
+    try:
+        abs_path = os.path.abspath(os.path.expanduser(abs_path))
+        rel_path = os.path.relpath(abs_path, cwd)
+        if rel_path.startswith("../.."):
+            return abs_path
+        return rel_path
+    except Exception:
+        return abs_path
+
 
 class ClaudeAgent(BaseAgent):
     """Existing Claude Code integration extracted into an agent backend."""
@@ -20,16 +54,26 @@ class ClaudeAgent(BaseAgent):
         super().__init__(controller)
         self.session_handler = controller.session_handler
         self.session_manager = controller.session_manager
-        self.receiver_tasks = controller.receiver_tasks
         self.claude_sessions = controller.claude_sessions
         self.claude_client = controller.claude_client
-        self._last_assistant_text: dict[str, str] = {}
+        # composite key -> last assistant text, bounded by LAST_ASSISTANT_TEXT_MAX
+        self._last_assistant_text: OrderedDict[str, str] = OrderedDict()
+        # In-flight background ack deletions (kept referenced until done)
+        self._ack_delete_tasks: set[asyncio.Task] = set()
 
     async def handle_message(self, request: AgentRequest) -> None:
         context = request.context
 
         try:
-            client = await self.session_handler.get_or_create_claude_session(context)
+            client = await self.session_handler.get_or_create_claude_session(
+                context,
+                session_info=(
+                    request.base_session_id,
+                    request.working_path,
+                    request.composite_session_id,
+                ),
+                settings_key=request.settings_key,
+            )
 
             await client.query(
                 request.message, session_id=request.composite_session_id
@@ -38,24 +82,28 @@ class ClaudeAgent(BaseAgent):
                 f"Sent message to Claude for session {request.composite_session_id}"
             )
 
-            await self._delete_ack(context, request)
+            self._schedule_ack_delete(context, request)
 
-            if (
-                request.composite_session_id not in self.receiver_tasks
-                or self.receiver_tasks[request.composite_session_id].done()
-            ):
-                self.receiver_tasks[request.composite_session_id] = asyncio.create_task(
+            session = self.claude_sessions[request.composite_session_id]
+            if session.receiver_task is None or session.receiver_task.done():
+                task = asyncio.create_task(
                     self._receive_messages(
                         client, request.base_session_id, request.working_path, context
                     )
                 )
+                session.receiver_task = task
+                task.add_done_callback(
+                    functools.partial(
+                        self._evict_receiver_task, request.composite_session_id
+                    )
+                )
         except Exception as e:
             logger.error(f"Error processing Claude message: {e}", exc_info=True)
             await self.session_handler.handle_session_error(
                 request.composite_session_id, context, e
             )
         finally:
-            await self._delete_ack(context, request)
+            self._schedule_ack_delete(context, request)
 
     async def clear_sessions(self, settings_key: str) -> int:
         """Clear Claude sessions scoped to the provided settings key."""
@@ -65,21 +113,27 @@ class ClaudeAgent(BaseAgent):
 
         self.settings_manager.clear_agent_sessions(settings_key, self.name)
 
-        sessions_to_clear = []
-        for session_key in list(self.claude_sessions.keys()):
-            base_part = session_key.split(":")[0] if ":" in session_key else session_key
-            if base_part in session_bases_to_clear:
-                sessions_to_clear.append(session_key)
+        # Composite keys are "<base>:<path>"; partition yields the base without a list
+        sessions_to_clear = (
+            [
+                session_key
+                for session_key in self.claude_sessions
+                if session_key.partition(":")[0] in session_bases_to_clear
+            ]
+            if session_bases_to_clear
+            else []
+        )
 
         for session_key in sessions_to_clear:
             try:
-                client = self.claude_sessions[session_key]
+                client = self.claude_sessions[session_key].client
                 if hasattr(client, "close"):
                     await client.close()
             except Exception as e:
                 logger.warning(f"Error closing Claude session {session_key}: {e}")
             finally:
                 self.claude_sessions.pop(session_key, None)
+                self._last_assistant_text.pop(session_key, None)
 
         # Legacy session manager cleanup (best-effort)
         await self.session_manager.clear_session(settings_key)
@@ -88,10 +142,11 @@ class ClaudeAgent(BaseAgent):
 
     async def handle_stop(self, request: AgentRequest) -> bool:
         composite_key = request.composite_session_id
-        if composite_key not in self.claude_sessions:
+        session = self.claude_sessions.get(composite_key)
+        if session is None:
             return False
 
-        client = self.claude_sessions[composite_key]
+        client = session.client
         await self.controller.emit_agent_message(
             request.context, "notify", "🛑 Interrupting Claude session..."
         )
@@ -126,6 +181,10 @@ class ClaudeAgent(BaseAgent):
         try:
             settings_key = self.controller._get_settings_key(context)
             composite_key = f"{base_session_id}:{working_path}"
+            # The session is bound to working_path, so resolved paths stay valid
+            relative_path = functools.lru_cache(maxsize=RELATIVE_PATH_CACHE_SIZE)(
+                functools.partial(_relative_path, working_path)
+            )
             async for message in client.receive_messages():
                 try:
                     claude_session_id = self._maybe_capture_session_id(
@@ -140,73 +199,51 @@ class ClaudeAgent(BaseAgent):
                         continue
 
                     message_type = self._detect_message_type(message)
+                    # Cached per conversation and invalidated on settings changes
+                    _, hidden_types = self.controller._get_emit_settings(context)
                     formatted_message = None
                     if message_type == "assistant":
-                        formatted_message = self.claude_client.format_message(
-                            message,
-                            get_relative_path=lambda path: self.get_relative_path(
-                                path, context
-                            ),
-                        )
+                        # Text-only fallback for the result; much cheaper than
+                        # format_message, which is skipped for hidden messages
                         assistant_text = self._extract_text_blocks(message)
                         if assistant_text:
-                            self._last_assistant_text[composite_key] = assistant_text
-                        if self.settings_manager.is_message_type_hidden(
-                            settings_key, message_type
-                        ):
+                            self._remember_assistant_text(composite_key, assistant_text)
+                        if message_type in hidden_types:
                             continue
+                        formatted_message = self.claude_client.format_message(
+                            message,
+                            get_relative_path=relative_path,
+                        )
                     elif message_type == "result":
-                        if self.settings_manager.is_message_type_hidden(
-                            settings_key, message_type
-                        ):
-                            self._last_assistant_text.pop(composite_key, None)
+                        if message_type in hidden_types:
+                            await self._finish_turn(context, composite_key)
                             continue
                         result_text = getattr(message, "result", None)
-                        if (
-                            not result_text
-                            and self.settings_manager.is_message_type_hidden(
-                                settings_key, "assistant"
-                            )
-                        ):
+                        if not result_text and "assistant" in hidden_types:
                             fallback = self._last_assistant_text.get(composite_key)
                             if fallback:
                                 result_text = fallback
-                        suffix = "---" if self.config.platform == "slack" else None
                         await self.emit_result_message(
                             context,
                             result_text,
                             subtype=getattr(message, "subtype", "") or "",
                             duration_ms=getattr(message, "duration_ms", 0),
                             parse_mode="markdown",
-                            suffix=suffix,
-                        )
-                        self._last_assistant_text.pop(composite_key, None)
-                        session = await self.session_manager.get_or_create_session(
-                            context.user_id, context.channel_id
+                            suffix=self._result_suffix,
                         )
-                        if session:
-                            session.session_active[
-                                f"{base_session_id}:{working_path}"
-                            ] = False
+                        await self._finish_turn(context, composite_key)
                         continue
                     else:
-                        if message_type and self.settings_manager.is_message_type_hidden(
-                            settings_key, message_type
-                        ):
-                            if message_type == "result":
-                                self._last_assistant_text.pop(composite_key, None)
+                        if message_type in hidden_types:
                             continue
                         formatted_message = self.claude_client.format_message(
                             message,
-                            get_relative_path=lambda path: self.get_relative_path(
-                                path, context
-                            ),
+                            get_relative_path=relative_path,
                         )
                     if not formatted_message or not formatted_message.strip():
                         continue
 
-                    if self.config.platform == "slack":
-                        formatted_message = formatted_message + "\n---"
+                    formatted_message += self._message_tail
 
                     await self.controller.emit_agent_message(
                         context,
@@ -214,16 +251,6 @@ class ClaudeAgent(BaseAgent):
                         formatted_message,
                         parse_mode="markdown",
                     )
-
-                    if message_type == "result":
-                        self._last_assistant_text.pop(composite_key, None)
-                        session = await self.session_manager.get_or_create_session(
-                            context.user_id, context.channel_id
-                        )
-                        if session:
-                            session.session_active[
-                                f"{base_session_id}:{working_path}"
-                            ] = False
                 except Exception as e:
                     logger.error(
                         f"Error processing message from Claude: {e}", exc_info=True
@@ -231,21 +258,55 @@ class ClaudeAgent(BaseAgent):
                     continue
         except Exception as e:
             composite_key = f"{base_session_id}:{working_path}"
+            self._last_assistant_text.pop(composite_key, None)
             logger.error(
                 f"Error in Claude receiver for session {composite_key}: {e}",
                 exc_info=True,
             )
             await self.session_handler.handle_session_error(composite_key, context, e)
 
-    async def _delete_ack(self, context: MessageContext, request: AgentRequest):
-        ack_id = request.ack_message_id
-        if ack_id and hasattr(self.im_client, "delete_message"):
-            try:
-                await self.im_client.delete_message(context.channel_id, ack_id)
-            except Exception as err:
-                logger.debug(f"Could not delete ack message: {err}")
-            finally:
-                request.ack_message_id = None
+    async def _finish_turn(self, context: MessageContext, composite_key: str):
+        """Single cleanup for a result message, whether shown or hidden."""
+        self._last_assistant_text.pop(composite_key, None)
+        session = await self.session_manager.get_or_create_session(
+            context.user_id, context.channel_id
+        )
+        if session:
+            session.session_active[composite_key] = False
+
+    def _remember_assistant_text(self, composite_key: str, text: str):
+        """Store the result fallback text, evicting the oldest past the cap."""
+        texts = self._last_assistant_text
+        texts[composite_key] = text
+        texts.move_to_end(composite_key)
+        if len(texts) > LAST_ASSISTANT_TEXT_MAX:
+            texts.popitem(last=False)
+
+    def _evict_receiver_task(self, composite_key: str, task: asyncio.Task):
+        """Drop a finished receiver task unless it was already replaced."""
+        session = self.claude_sessions.get(composite_key)
+        if session is not None and session.receiver_task is task:
+            session.receiver_task = None
+
+    def _schedule_ack_delete(self, context: MessageContext, request: AgentRequest):
+        """Delete the ack in the background so it never delays the agent."""
+        if self._delete_message is None:
+            return
+        if request.ack_task is None and not request.ack_message_id:
+            return
+        task = asyncio.create_task(self._delete_ack(context.channel_id, request))
+        self._ack_delete_tasks.add(task)
+        task.add_done_callback(self._ack_delete_tasks.discard)
+
+    async def _delete_ack(self, channel_id: str, request: AgentRequest):
+        # The id is claimed once, so a second scheduled delete is a no-op
+        ack_id = await request.take_ack_id()
+        if not ack_id:
+            return
+        try:
+            await self._delete_message(channel_id, ack_id)
+        except Exception as err:
+            logger.debug(f"Could not delete ack message: {err}")
 
     def get_relative_path(
         self, abs_path: str, context: Optional[MessageContext] = None
@@ -253,24 +314,13 @@ class ClaudeAgent(BaseAgent):
         """Convert absolute path to relative path from working directory."""
         try:
             cwd = self.session_handler.get_working_path(context)
-            abs_path = os.path.abspath(os.path.expanduser(abs_path))
-            rel_path = os.path.relpath(abs_path, cwd)
-            if rel_path.startswith("../.."):
-                return abs_path
-            return rel_path
         except Exception:
             return abs_path
+        return _relative_path(cwd, abs_path)
 
     def _get_target_context(self, context: MessageContext) -> MessageContext:
         """Return context for sending messages (respect Slack thread replies)."""
-        if self.im_client.should_use_thread_for_reply() and context.thread_id:
-            return MessageContext(
-                user_id=context.user_id,
-                channel_id=context.channel_id,
-                thread_id=context.thread_id,
-                message_id=context.message_id,
-                platform_specific=context.platform_specific,
-            )
+        # Replies already carry their thread_id, so the context is used as-is
         return context
 
     def _maybe_capture_session_id(
@@ -282,8 +332,7 @@ class ClaudeAgent(BaseAgent):
     ) -> Optional[str]:
         """Capture session id from system init messages."""
         if (
-            hasattr(message, "__class__")
-            and message.__class__.__name__ == "SystemMessage"
+            type(message) is SystemMessage
             and getattr(message, "subtype", None) == "init"
             and getattr(message, "data", None)
         ):
@@ -297,23 +346,15 @@ class ClaudeAgent(BaseAgent):
 
     def _extract_text_blocks(self, message) -> str:
         """Extract text-only content blocks for result fallbacks."""
-        parts = []
-        for block in getattr(message, "content", []) or []:
-            if isinstance(block, TextBlock):
-                text = block.text.strip() if block.text else ""
-                if text:
-                    parts.append(self.claude_client.formatter.escape_special_chars(text))
-        return "\n\n".join(parts).strip()
+        escape = self.claude_client.formatter.escape_special_chars
+        texts = (
+            (block.text or "").strip()
+            for block in getattr(message, "content", None) or ()
+            if isinstance(block, TextBlock)
+        )
+        # Each text is stripped before escaping, so the joined result needs no strip
+        return "\n\n".join(escape(text) for text in texts if text)
 
     def _detect_message_type(self, message) -> Optional[str]:
         """Infer message type name from Claude SDK class."""
-        if not hasattr(message, "__class__"):
-            return None
-        class_name = message.__class__.__name__
-        mapping = {
-            "SystemMessage": "system",
-            "UserMessage": "user",
-            "AssistantMessage": "assistant",
-            "ResultMessage": "result",
-        }
-        return mapping.get(class_name)
+        return _MESSAGE_TYPES.get(type(message))
@@ -10,10 +10,22 @@ from markdown_to_mrkdwn import SlackMarkdownConverter
 
 from modules.agents.base import AgentRequest, BaseAgent
 
+try:
+    import orjson  # type: ignore
+except ImportError:  # optional speedup; stdlib json is the fallback
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
 STREAM_BUFFER_LIMIT = 8 * 1024 * 1024  # 8MB cap for Codex stdout/stderr streams
 
+# Run Codex in its own process group where supported so /stop can kill the tree
+_SPAWN_KWARGS = {"preexec_fn": os.setsid} if hasattr(os, "setsid") else {}
+_HAS_KILLPG = hasattr(os, "getpgid")
+
+# Parses one raw stdout line; both accept bytes, so no decode is needed first
+_loads_event = orjson.loads if orjson is not None else json.loads
+
 class CodexAgent(BaseAgent):
     """Codex CLI integration via codex exec JSON streaming mode."""
 
@@ -54,8 +66,8 @@ class CodexAgent(BaseAgent):
             agent_name=self.name,
         )
 
-        if not os.path.exists(request.working_path):
-            os.makedirs(request.working_path, exist_ok=True)
+        # Off the event loop: slow mounts would otherwise stall every chat
+        await asyncio.to_thread(os.makedirs, request.working_path, exist_ok=True)
 
         cmd = self._build_command(request, resume_id)
         try:
@@ -65,7 +77,7 @@ class CodexAgent(BaseAgent):
                 stderr=asyncio.subprocess.PIPE,
                 cwd=request.working_path,
                 limit=STREAM_BUFFER_LIMIT,
-                **({"preexec_fn": os.setsid} if hasattr(os, "setsid") else {}),
+                **_SPAWN_KWARGS,
             )
         except FileNotFoundError:
             await self.controller.emit_agent_message(
@@ -93,16 +105,15 @@ class CodexAgent(BaseAgent):
             f"Codex session {request.composite_session_id} started (pid={process.pid})"
         )
 
-        stdout_task = asyncio.create_task(
-            self._consume_stdout(process, request)
-        )
+        # stdout is consumed on this task; only stderr needs its own
         stderr_task = asyncio.create_task(
             self._consume_stderr(process, request)
         )
 
         try:
+            await self._consume_stdout(process, request)
             await process.wait()
-            await asyncio.gather(stdout_task, stderr_task)
+            await stderr_task
         finally:
             self._unregister_process(request.composite_session_id)
 
@@ -148,7 +159,7 @@ class CodexAgent(BaseAgent):
 
         proc, _ = entry
         try:
-            if hasattr(os, "getpgid"):
+            if _HAS_KILLPG:
                 try:
                     os.killpg(os.getpgid(proc.pid), signal.SIGKILL)
                 except ProcessLookupError:
@@ -195,13 +206,16 @@ class CodexAgent(BaseAgent):
                     break
                 if not line:
                     break
-                line = line.decode().strip()
+                line = line.strip()
                 if not line:
                     continue
                 try:
-                    event = json.loads(line)
-                except json.JSONDecodeError:
-                    logger.debug(f"Codex emitted non-JSON line: {line}")
+                    event = _loads_event(line)
+                except ValueError:
+                    # JSONDecodeError (stdlib and orjson) or undecodable UTF-8
+                    logger.debug(
+                        f"Codex emitted non-JSON line: {line.decode(errors='replace')}"
+                    )
                     continue
                 await self._handle_event(event, request)
         except Exception as err:
@@ -251,8 +265,7 @@ class CodexAgent(BaseAgent):
                 system_text = self.im_client.formatter.format_system_message(
                     request.working_path, "init", thread_id
                 )
-                if self.config.platform == "slack":
-                    system_text = system_text + "\n---"
+                system_text += self._message_tail
                 parse_mode = None if self._slack_markdown_converter else "markdown"
                 await self.controller.emit_agent_message(
                     request.context,
@@ -333,16 +346,14 @@ class CodexAgent(BaseAgent):
             return
 
     async def _delete_ack(self, request: AgentRequest):
-        ack_id = request.ack_message_id
-        if ack_id and hasattr(self.im_client, "delete_message"):
+        if self._delete_message is None:
+            return
+        ack_id = await request.take_ack_id()
+        if ack_id:
             try:
-                await self.im_client.delete_message(
-                    request.context.channel_id, ack_id
-                )
+                await self._delete_message(request.context.channel_id, ack_id)
             except Exception as err:
                 logger.debug(f"Could not delete ack message: {err}")
-            finally:
-                request.ack_message_id = None
 
     def _prepare_last_message_payload(
         self, text: str
@@ -1,6 +1,7 @@
 """OpenCode Server API integration as an agent backend."""
 
 import asyncio
+import contextlib
 import logging
 import os
 import time
@@ -115,6 +116,9 @@ class OpenCodeServerManager:
                 self._base_url = f"http://{self.host}:{self.port}"
                 logger.info(f"OpenCode server started at {self._base_url}")
                 return
+            # A dead process will never become healthy; stop polling
+            if self._process.returncode is not None:
+                break
             await asyncio.sleep(0.5)
 
         exit_code = self._process.returncode
@@ -503,8 +507,8 @@ class OpenCodeAgent(BaseAgent):
 
         await self._delete_ack(request)
 
-        if not os.path.exists(request.working_path):
-            os.makedirs(request.working_path, exist_ok=True)
+        # Off the event loop: slow mounts would otherwise stall every chat
+        await asyncio.to_thread(os.makedirs, request.working_path, exist_ok=True)
 
         session_id = self.settings_manager.get_agent_session_id(
             request.settings_key,
@@ -601,8 +605,10 @@ class OpenCodeAgent(BaseAgent):
             model_str = override_model
             if not model_str:
                 # OpenCode server doesn't use agent's configured model when called via API,
-                # so we read it from opencode.json explicitly
-                model_str = server.get_agent_model_from_config(agent_to_use)
+                # so we read it from opencode.json explicitly (file I/O, off the loop)
+                model_str = await asyncio.to_thread(
+                    server.get_agent_model_from_config, agent_to_use
+                )
             if model_str:
                 parts = model_str.split("/", 1)
                 if len(parts) == 2:
@@ -612,7 +618,9 @@ class OpenCodeAgent(BaseAgent):
             # Priority: 1) channel override, 2) agent's config, 3) global opencode.json config
             reasoning_effort = override_reasoning
             if not reasoning_effort:
-                reasoning_effort = server.get_agent_reasoning_effort_from_config(agent_to_use)
+                reasoning_effort = await asyncio.to_thread(
+                    server.get_agent_reasoning_effort_from_config, agent_to_use
+                )
 
             response = await server.send_message(
                 session_id=session_id,
@@ -683,10 +691,8 @@ class OpenCodeAgent(BaseAgent):
                 logger.warning(f"Failed to abort OpenCode session: {e}")
 
         task.cancel()
-        try:
-            await task
-        except asyncio.CancelledError:
-            pass
+        # Unlike awaiting the task, wait() lets a cancelled /stop propagate
+        await asyncio.wait((task,))
 
         await self.controller.emit_agent_message(
             request.context, "notify", "Terminated OpenCode execution."
@@ -701,25 +707,20 @@ class OpenCodeAgent(BaseAgent):
             req_info = self._request_sessions.get(base_id)
             if req_info and len(req_info) >= 3 and req_info[2] == settings_key:
                 if not task.done():
-                    try:
+                    with contextlib.suppress(Exception):
                         server = await self._get_server()
                         await server.abort_session(req_info[0], req_info[1])
-                    except Exception:
-                        pass
                     task.cancel()
-                    try:
-                        await task
-                    except asyncio.CancelledError:
-                        pass
+                    await asyncio.wait((task,))
                     terminated += 1
         return terminated
 
     async def _delete_ack(self, request: AgentRequest):
-        ack_id = request.ack_message_id
-        if ack_id and hasattr(self.im_client, "delete_message"):
+        if self._delete_message is None:
+            return
+        ack_id = await request.take_ack_id()
+        if ack_id:
             try:
-                await self.im_client.delete_message(request.context.channel_id, ack_id)
+                await self._delete_message(request.context.channel_id, ack_id)
             except Exception as err:
                 logger.debug(f"Could not delete ack message: {err}")
-            finally:
-                request.ack_message_id = None
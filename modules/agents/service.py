@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from typing import Dict, Optional
 
@@ -29,11 +30,22 @@ class AgentService:
         await agent.handle_message(request)
 
     async def clear_sessions(self, settings_key: str) -> Dict[str, int]:
+        # Backends are independent; tear them down concurrently, and one
+        # failing backend must not stop the others from being cleared
+        names = list(self.agents)
+        results = await asyncio.gather(
+            *(self.agents[name].clear_sessions(settings_key) for name in names),
+            return_exceptions=True,
+        )
         cleared: Dict[str, int] = {}
-        for name, agent in self.agents.items():
-            count = await agent.clear_sessions(settings_key)
-            if count:
-                cleared[name] = count
+        for name, result in zip(names, results):
+            if isinstance(result, BaseException):
+                logger.error(
+                    f"Failed to clear {name} sessions for {settings_key}: {result}",
+                    exc_info=result,
+                )
+            elif result:
+                cleared[name] = result
         return cleared
 
     async def handle_stop(self, agent_name: str, request: AgentRequest) -> bool:
@@ -2,14 +2,14 @@
 
 import logging
 from abc import ABC, abstractmethod
-from typing import Optional, Callable, Dict, Any
-from dataclasses import dataclass
+from typing import Optional, Callable, Dict, Any, Mapping
+from dataclasses import dataclass, field
 
 logger = logging.getLogger(__name__)
 
 
 # Data structures for platform-agnostic messaging
-@dataclass
+@dataclass(slots=True)
 class MessageContext:
     """Platform-agnostic message context"""
     user_id: str
@@ -33,14 +33,16 @@ class InlineKeyboard:
 
 
 # Configuration base class
-@dataclass
+@dataclass(slots=True)
 class BaseIMConfig(ABC):
     """Abstract base class for IM platform configurations"""
+
+    _validated: bool = field(default=False, init=False, repr=False, compare=False)
     
     @classmethod
     @abstractmethod
-    def from_env(cls) -> 'BaseIMConfig':
-        """Create configuration from environment variables"""
+    def from_env(cls, env: Optional[Mapping[str, str]] = None) -> 'BaseIMConfig':
+        """Create configuration from environment variables (os.environ by default)"""
         pass
     
     @abstractmethod
@@ -55,6 +57,17 @@ class BaseIMConfig(ABC):
         """
         pass
     
+    def ensure_validated(self) -> bool:
+        """Run validate() once; later calls are no-ops
+        
+        Raises:
+            ValueError: If configuration is invalid
+        """
+        if not self._validated:
+            self.validate()
+            self._validated = True
+        return True
+    
     def validate_required_string(self, value: Optional[str], field_name: str) -> None:
         """Helper method to validate required string fields
         
@@ -93,6 +106,9 @@ class BaseIMConfig(ABC):
 # IM Client base class
 class BaseIMClient(ABC):
     """Abstract base class for IM platform clients"""
+
+    # Capability flags (override in subclasses)
+    supports_settings_manager_injection: bool = False
     
     def __init__(self, config: BaseIMConfig):
         self.config = config
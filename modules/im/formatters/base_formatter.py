@@ -2,6 +2,43 @@ from abc import ABC, abstractmethod
 from typing import Optional, List, Tuple, Any, Dict
 import json
 
+# Lookup tables used per tool/todo line; built once at import
+_TOOL_EMOJIS = {
+    "Task": "🤖",
+    "Bash": "💻",
+    "Glob": "🔍",
+    "Grep": "🔎",
+    "LS": "📂",
+    "Read": "📖",
+    "Edit": "✏️",
+    "MultiEdit": "📝",
+    "Write": "📄",
+    "NotebookRead": "📓",
+    "NotebookEdit": "📓",
+    "WebFetch": "🌐",
+    "WebSearch": "🔍",
+    "TodoWrite": "✅",
+    "ExitPlanMode": "🚪",
+}
+_TODO_STATUS_EMOJIS = {"pending": "⏳", "in_progress": "🔄", "completed": "✅"}
+_TODO_PRIORITY_EMOJIS = {"high": "🔴", "medium": "🟡", "low": "🟢"}
+_CONTENT_PREVIEW_TOOLS = frozenset({"Write", "Edit", "MultiEdit"})
+_NO_JSON_TOOLS = frozenset(
+    {
+        "Bash",
+        "Read",
+        "Write",
+        "Edit",
+        "MultiEdit",
+        "LS",
+        "Glob",
+        "Grep",
+        "WebFetch",
+        "WebSearch",
+        "TodoWrite",
+    }
+)
+
 
 class BaseMarkdownFormatter(ABC):
     """Abstract base class for platform-specific markdown formatters"""
@@ -339,9 +376,7 @@ class BaseMarkdownFormatter(ABC):
     ) -> str:
         """Format result message"""
         # Calculate duration
-        total_seconds = duration_ms / 1000
-        minutes = int(total_seconds // 60)
-        seconds = int(total_seconds % 60)
+        minutes, seconds = divmod(int(duration_ms) // 1000, 60)
 
         if minutes > 0:
             duration_str = f"{minutes}m {seconds}s"
@@ -378,11 +413,9 @@ class BaseMarkdownFormatter(ABC):
         self, status: str, priority: str, content: str, completed: bool = False
     ) -> str:
         """Format a todo item with status and priority"""
-        status_emoji = {"pending": "⏳", "in_progress": "🔄", "completed": "✅"}.get(
-            status, "⏳"
-        )
+        status_emoji = _TODO_STATUS_EMOJIS.get(status, "⏳")
 
-        priority_emoji = {"high": "🔴", "medium": "🟡", "low": "🟢"}.get(priority, "🟡")
+        priority_emoji = _TODO_PRIORITY_EMOJIS.get(priority, "🟡")
 
         # Truncate long content
         if len(content) > 50:
@@ -405,29 +438,13 @@ class BaseMarkdownFormatter(ABC):
         """Format tool use block with inputs"""
         # Determine tool emoji and category
         if tool_name.startswith("mcp__"):
-            tool_category = tool_name.split("__")[1] if "__" in tool_name else "mcp"
+            # "mcp__<server>__<tool>": take the server segment without a full split
+            tool_category = tool_name[5:].partition("__")[0]
 
             emoji = "🔧"
             tool_info = f"{emoji} {tool_category} {self.format_bold('MCP Tool')}: {self.format_code_inline(tool_name)}"
         else:
-            tool_emoji_map = {
-                "Task": "🤖",
-                "Bash": "💻",
-                "Glob": "🔍",
-                "Grep": "🔎",
-                "LS": "📂",
-                "Read": "📖",
-                "Edit": "✏️",
-                "MultiEdit": "📝",
-                "Write": "📄",
-                "NotebookRead": "📓",
-                "NotebookEdit": "📓",
-                "WebFetch": "🌐",
-                "WebSearch": "🔍",
-                "TodoWrite": "✅",
-                "ExitPlanMode": "🚪",
-            }
-            emoji = tool_emoji_map.get(tool_name, "🔧")
+            emoji = _TOOL_EMOJIS.get(tool_name, "🔧")
             tool_info = f"{emoji} {self.format_bold('Tool')}: {self.format_code_inline(tool_name)}"
 
         # Format tool inputs
@@ -563,7 +580,7 @@ class BaseMarkdownFormatter(ABC):
                 todo_line = self.format_todo_item(status, priority, content, completed)
                 tool_info += f"\n{todo_line}"
 
-        elif tool_name in ["Write", "Edit", "MultiEdit"] and "content" in tool_input:
+        elif tool_name in _CONTENT_PREVIEW_TOOLS and "content" in tool_input:
             content = str(tool_input["content"])
             if len(content) > 300:
                 content = content[:300] + "..."
@@ -580,19 +597,6 @@ class BaseMarkdownFormatter(ABC):
 
     def _should_show_json(self, tool_name: str, tool_input: Dict[str, Any]) -> bool:
         """Determine if JSON should be shown for tool input"""
-        no_json_tools = [
-            "Bash",
-            "Read",
-            "Write",
-            "Edit",
-            "MultiEdit",
-            "LS",
-            "Glob",
-            "Grep",
-            "WebFetch",
-            "WebSearch",
-            "TodoWrite",
-        ]
         return (
-            tool_name not in no_json_tools and tool_input and len(str(tool_input)) < 200
+            tool_name not in _NO_JSON_TOOLS and tool_input and len(str(tool_input)) < 200
         )
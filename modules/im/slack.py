@@ -19,6 +19,8 @@ logger = logging.getLogger(__name__)
 class SlackBot(BaseIMClient):
     """Slack implementation of the IM client"""
 
+    supports_settings_manager_injection = True
+
     def __init__(self, config: SlackConfig):
         super().__init__(config)
         self.config = config
@@ -6,6 +6,11 @@ from dataclasses import dataclass, asdict, field
 from typing import Any, Dict, List, Optional, Union
 from pathlib import Path
 
+try:
+    import orjson  # type: ignore
+except ImportError:  # optional speedup; stdlib json is the fallback
+    orjson = None
+
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +18,20 @@ logger = logging.getLogger(__name__)
 DEFAULT_HIDDEN_MESSAGE_TYPES = ["system", "assistant", "user"]
 
 
+def _json_loads(data: bytes) -> Any:
+    """Parse JSON with orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _json_dumps(data: Any) -> bytes:
+    """Serialize settings as indented JSON, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2).encode("utf-8")
+
+
 @dataclass
 class ChannelRouting:
     """Per-channel agent routing configuration."""
@@ -80,8 +99,29 @@ class SettingsManager:
     def __init__(self, settings_file: str = "user_settings.json"):
         self.settings_file = Path(settings_file)
         self.settings: Dict[Union[int, str], UserSettings] = {}
+        # Bumped only when the named setting changes so callers can validate
+        # derived caches; session/thread bookkeeping writes happen on every
+        # message and must not invalidate them
+        self._cwd_version = 0
+        self._routing_version = 0
+        self._visibility_version = 0
         self._load_settings()
 
+    @property
+    def cwd_version(self) -> int:
+        """Monotonic counter of custom cwd changes"""
+        return self._cwd_version
+
+    @property
+    def routing_version(self) -> int:
+        """Monotonic counter of channel routing changes"""
+        return self._routing_version
+
+    @property
+    def visibility_version(self) -> int:
+        """Monotonic counter of hidden message type changes"""
+        return self._visibility_version
+
     # ---------------------------------------------
     # Internal helpers
     # ---------------------------------------------
@@ -97,8 +137,8 @@ class SettingsManager:
         """Load settings from JSON file"""
         try:
             if self.settings_file.exists():
-                with open(self.settings_file, "r") as f:
-                    data = json.load(f)
+                with open(self.settings_file, "rb") as f:
+                    data = _json_loads(f.read())
                     for user_id_str, user_data in data.items():
                         # Normalize session mappings to agent-aware structure
                         if "session_mappings" in user_data:
@@ -162,8 +202,9 @@ class SettingsManager:
                 str(user_id): settings.to_dict()
                 for user_id, settings in self.settings.items()
             }
-            with open(self.settings_file, "w") as f:
-                json.dump(data, f, indent=2)
+            payload = _json_dumps(data)
+            with open(self.settings_file, "wb") as f:
+                f.write(payload)
             logger.info("Settings saved successfully")
         except Exception as e:
             logger.error(f"Error saving settings: {e}")
@@ -199,13 +240,24 @@ class SettingsManager:
             settings.hidden_message_types.append(message_type)
             is_hidden = True
 
+        self._visibility_version += 1
         self.update_user_settings(user_id, settings)
         return is_hidden
 
+    def set_hidden_message_types(
+        self, user_id: Union[int, str], hidden_message_types: List[str]
+    ):
+        """Replace the hidden message types for user"""
+        settings = self.get_user_settings(user_id)
+        settings.hidden_message_types = hidden_message_types
+        self._visibility_version += 1
+        self.update_user_settings(user_id, settings)
+
     def set_custom_cwd(self, user_id: Union[int, str], cwd: str):
         """Set custom working directory for user"""
         settings = self.get_user_settings(user_id)
         settings.custom_cwd = cwd
+        self._cwd_version += 1
         self.update_user_settings(user_id, settings)
 
     def get_custom_cwd(self, user_id: Union[int, str]) -> Optional[str]:
@@ -461,6 +513,7 @@ class SettingsManager:
         """Set channel routing override."""
         settings = self.get_user_settings(settings_key)
         settings.channel_routing = routing
+        self._routing_version += 1
         self.update_user_settings(settings_key, settings)
         logger.info(
             f"Updated channel routing for {settings_key}: "
@@ -474,5 +527,6 @@ class SettingsManager:
         settings = self.get_user_settings(settings_key)
         if settings.channel_routing:
             settings.channel_routing = None
+            self._routing_version += 1
             self.update_user_settings(settings_key, settings)
             logger.info(f"Cleared channel routing for {settings_key}")
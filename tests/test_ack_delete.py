@@ -0,0 +1,101 @@
+"""Tests for deleting the acknowledgement message exactly once"""
+
+import asyncio
+from types import SimpleNamespace
+
+from core.handlers.message_handler import MessageHandler
+from modules.agents import AgentRequest, ClaudeAgent
+from modules.im import MessageContext
+
+
+class FakeIMClient:
+    """IM client stand-in that records sends and deletes."""
+
+    def __init__(self):
+        self.formatter = SimpleNamespace(format_error=lambda text: text)
+        self.sent = []
+        self.deleted = []
+
+    async def send_message(self, context, text, parse_mode=None):
+        # Returns without yielding, so the ack is sent before the agent returns
+        self.sent.append(text)
+        return f"ACK{len(self.sent)}"
+
+    async def delete_message(self, channel_id, message_id):
+        await asyncio.sleep(0)
+        self.deleted.append(message_id)
+        return True
+
+
+class FakeClaudeClient:
+    async def query(self, message, session_id=None):
+        await asyncio.sleep(0)
+
+
+def _build(im_client):
+    context = MessageContext(user_id="U1", channel_id="C1", thread_id="T1")
+    request = AgentRequest(
+        context=context,
+        message="hello",
+        working_path="/tmp",
+        base_session_id="base",
+        composite_session_id="base:/tmp",
+        settings_key="C1",
+    )
+
+    async def get_or_create_claude_session(*args, **kwargs):
+        return FakeClaudeClient()
+
+    handlers = SimpleNamespace(
+        handle_info_message_types=None,
+        handle_info_how_it_works=None,
+        handle_toggle_message_type=None,
+        handle_cwd=None,
+        handle_change_cwd_modal=None,
+        handle_clear=None,
+        handle_settings=None,
+        handle_routing=None,
+    )
+    controller = SimpleNamespace(
+        config=SimpleNamespace(platform="slack"),
+        im_client=im_client,
+        session_manager=None,
+        settings_manager=None,
+        settings_handler=handlers,
+        command_handler=handlers,
+        session_handler=SimpleNamespace(
+            get_or_create_claude_session=get_or_create_claude_session
+        ),
+        claude_client=None,
+        # A live receiver task means handle_message starts no new receiver
+        claude_sessions={
+            "base:/tmp": SimpleNamespace(
+                receiver_task=SimpleNamespace(done=lambda: False)
+            )
+        },
+    )
+    agent = ClaudeAgent(controller)
+
+    async def handle_message(agent_name, agent_request):
+        await agent.handle_message(agent_request)
+
+    controller.agent_service = SimpleNamespace(handle_message=handle_message)
+    handler = MessageHandler(controller)
+    handler.set_session_handler(
+        SimpleNamespace(build_agent_request=lambda ctx, msg: ("claude", request))
+    )
+    return handler, agent, context
+
+
+def test_ack_is_deleted_once_when_agent_and_handler_both_clean_up():
+    im_client = FakeIMClient()
+    handler, agent, context = _build(im_client)
+
+    async def run():
+        await handler.handle_user_message(context, "hello")
+        if agent._ack_delete_tasks:
+            await asyncio.gather(*agent._ack_delete_tasks)
+
+    asyncio.run(run())
+    assert im_client.sent == ["📨 Claude received, processing..."]
+    assert im_client.deleted == ["ACK1"]
@@ -0,0 +1,123 @@
+"""Tests for batching of agent messages in Controller.emit_agent_message"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from core import controller as controller_module
+from core.controller import Controller
+from modules.im import MessageContext
+
+
+class RecordingIMClient:
+    """IM client stand-in that records sends and can fail on demand."""
+
+    def __init__(self, fail_over: int = 0):
+        self.sent = []
+        self.fail_over = fail_over
+
+    async def send_message(self, context, text, parse_mode=None):
+        await asyncio.sleep(0)
+        if self.fail_over and len(text) > self.fail_over:
+            raise RuntimeError("message is too long")
+        self.sent.append(text)
+        return str(len(self.sent))
+
+
+@pytest.fixture
+def make_controller(monkeypatch):
+    def noop(self):
+        pass
+
+    monkeypatch.setattr(Controller, "_init_modules", noop)
+    monkeypatch.setattr(Controller, "_init_agents", noop)
+    monkeypatch.setattr(Controller, "_setup_callbacks", noop)
+    monkeypatch.setattr(
+        Controller,
+        "_init_handlers",
+        lambda self: setattr(
+            self,
+            "session_handler",
+            SimpleNamespace(restore_session_mappings=lambda: None),
+        ),
+    )
+    monkeypatch.setattr(
+        Controller,
+        "_get_emit_settings",
+        lambda self, context: (context.channel_id, frozenset()),
+    )
+
+    def factory(platform="slack", **client_kwargs):
+        controller = Controller(SimpleNamespace(platform=platform))
+        controller.settings_manager = SimpleNamespace(MESSAGE_TYPE_ALIASES={})
+        controller.im_client = RecordingIMClient(**client_kwargs)
+        return controller
+
+    return factory
+
+
+def _context(thread_id=None):
+    return MessageContext(user_id="U1", channel_id="C1", thread_id=thread_id)
+
+
+def test_notify_and_result_flush_pending_chunks_first(make_controller):
+    controller = make_controller()
+
+    async def run():
+        context = _context()
+        await controller.emit_agent_message(context, "assistant", "one")
+        await controller.emit_agent_message(context, "assistant", "two")
+        await controller.emit_agent_message(context, "notify", "note")
+        await controller.emit_agent_message(context, "assistant", "three")
+        await controller.emit_agent_message(context, "result", "done")
+
+    asyncio.run(run())
+    assert controller.im_client.sent == ["one\n\ntwo", "note", "three", "done"]
+    assert controller._emit_buffers == {}
+    assert controller._emit_locks == {}
+
+
+def test_timer_flushes_batch(make_controller, monkeypatch):
+    monkeypatch.setattr(controller_module, "EMIT_BATCH_DELAY", 0.01)
+    controller = make_controller()
+
+    async def run():
+        context = _context()
+        await controller.emit_agent_message(context, "assistant", "one")
+        await controller.emit_agent_message(context, "assistant", "two")
+        assert controller.im_client.sent == []
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+    assert controller.im_client.sent == ["one\n\ntwo"]
+    assert controller._emit_buffers == {}
+    assert controller._emit_locks == {}
+
+
+def test_batch_splits_at_platform_size_cap(make_controller):
+    controller = make_controller(platform="telegram")
+    cap = controller_module.EMIT_BATCH_MAX_CHARS_BY_PLATFORM["telegram"]
+    chunk = "x" * (cap // 2)
+
+    async def run():
+        context = _context()
+        for _ in range(3):
+            await controller.emit_agent_message(context, "assistant", chunk)
+        await controller.emit_agent_message(context, "result", "done")
+
+    asyncio.run(run())
+    assert controller.im_client.sent == [f"{chunk}\n\n{chunk}", chunk, "done"]
+
+
+def test_failed_batch_is_resent_chunk_by_chunk(make_controller):
+    controller = make_controller(fail_over=5)
+
+    async def run():
+        context = _context()
+        await controller.emit_agent_message(context, "assistant", "one")
+        await controller.emit_agent_message(context, "assistant", "two")
+        await controller.emit_agent_message(context, "result", "done")
+
+    asyncio.run(run())
+    assert controller.im_client.sent == ["one", "two", "done"]